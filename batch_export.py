@@ -0,0 +1,113 @@
+import os
+import io
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use("Agg")   # Headless, no display needed
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+from utils.well_plots import well_top, well_dst
+from utils.top_dst_data import read_top_dst, partition_by_well, rows_in_depth_window
+from utils.local_files import open_inputs
+
+# Headless batch export of the well tops and DST plots of every well in a workbook, rendered across a process pool.
+# Uses the same loader and plot functions as the DSTs and Tops page.
+# Example:
+#   python batch_export.py tops_dsts.xlsx --out field_summary.pdf
+#   python batch_export.py well_top.csv well_dst.csv --out field_pngs --workers 8 --start 500 --stop 5500
+
+# Data of the worker process, set once per worker by init_worker (not sent again with every well)
+worker_data = {}
+
+def init_worker(top_partitions, dst_partitions, start_depth, stop_depth, dpi):
+    worker_data.update(top_partitions=top_partitions, dst_partitions=dst_partitions,
+                       start_depth=start_depth, stop_depth=stop_depth, dpi=dpi)
+
+# Render the tops and the DSTs plots of one well. Return the well name, the PNG images (name -> bytes) and the time
+def render_well(well_name):
+    started = time.perf_counter()
+    start_depth, stop_depth = worker_data["start_depth"], worker_data["stop_depth"]
+    images = {}
+    for plot_name, partitions, plot_func, cols in (("tops", worker_data["top_partitions"], well_top, (1, 3)),
+                                                   ("dsts", worker_data["dst_partitions"], well_dst, (3, 4, 2))):
+        if well_name not in partitions:
+            continue
+        show_df = rows_in_depth_window(partitions[well_name], start_depth, stop_depth)
+        fig = plot_func(show_df, start_depth, stop_depth, *cols)
+        try:
+            fig.suptitle(f"{well_name} - {plot_name.upper()}")
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png", dpi=worker_data["dpi"])
+            images[plot_name] = buffer.getvalue()
+        finally:
+            plt.close(fig)
+    return well_name, images, time.perf_counter() - started
+
+# Unique file names of the wells for the PNG files. Different well names can give the same safe name (e.g. "W 1/x" and
+# "W_1_x"), the repeated names get the index of the well appended, so no PNG overwrites another
+def output_names(wells):
+    # wells             : The well names, in export order
+    # Return a dict of well name -> file name (without the plot name and extension)
+    names, used = {}, set()
+    for index, well_name in enumerate(wells):
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(well_name))
+        # Compared in lower case, for the case-insensitive file systems
+        while name.lower() in used:
+            name = f"{name}_{index}"
+        used.add(name.lower())
+        names[well_name] = name
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the well tops and DST plots of every well")
+    parser.add_argument("inputs", nargs="+", help="Excel workbook (well_top and well_dst sheets) or well_top/well_dst CSV/Parquet files")
+    parser.add_argument("--out", required=True, help="Output multi-page PDF file (*.pdf) or directory of PNG files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: all cores)")
+    parser.add_argument("--start", type=float, default=500.0, help="Start depth (md) of the plots")
+    parser.add_argument("--stop", type=float, default=5500.0, help="Stop depth (md) of the plots")
+    parser.add_argument("--dpi", type=int, default=100, help="Resolution of the images")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    df_well_top, df_well_dst, _ = read_top_dst(open_inputs(args.inputs))
+    top_partitions = partition_by_well(df_well_top, "surface_md_m")
+    dst_partitions = partition_by_well(df_well_dst, "dst_depth_top_m", "dst_depth_base_m")
+    wells = sorted(set(top_partitions) | set(dst_partitions))
+    print(f"Loaded {len(wells)} wells in {time.perf_counter() - started:.2f}s")
+
+    to_pdf = args.out.lower().endswith(".pdf")
+    if not to_pdf:
+        os.makedirs(args.out, exist_ok=True)
+        file_names = output_names(wells)
+
+    # Render the wells across the process pool. The PNGs are written as they come, the PDF pages in well order
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(top_partitions, dst_partitions, args.start, args.stop, args.dpi)) as pool:
+        futures = [pool.submit(render_well, well_name) for well_name in wells]
+        for future in as_completed(futures):
+            well_name, images, seconds = future.result()
+            print(f"{well_name}: {seconds:.2f}s")
+            if to_pdf:
+                results[well_name] = images
+            else:
+                for plot_name, png in images.items():
+                    with open(os.path.join(args.out, f"{file_names[well_name]}_{plot_name}.png"), "wb") as f:
+                        f.write(png)
+
+    # One PDF page per image, the image is placed at its own pixel size (no resampling)
+    if to_pdf:
+        with PdfPages(args.out) as pdf:
+            for well_name in wells:
+                for png in results[well_name].values():
+                    image = plt.imread(io.BytesIO(png), format="png")
+                    fig = plt.figure(figsize=(image.shape[1] / args.dpi, image.shape[0] / args.dpi), dpi=args.dpi)
+                    fig.figimage(image)
+                    pdf.savefig(fig, dpi=args.dpi)
+                    plt.close(fig)
+
+    print(f"Exported {len(wells)} wells to {args.out} in {time.perf_counter() - started:.2f}s with {args.workers} workers")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import io
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import lasio
+from utils.las_reader import read_las
+
+# Benchmark of the fast LAS reader (utils/las_reader.py) against the lasio line parser used before.
+# Reads the given LAS files, or a generated one, with both readers, checks that the data are the same and prints the
+# time and the peak Python memory of each.
+# Example:
+#   python benchmark_las_reader.py
+#   python benchmark_las_reader.py --rows 2000000 --curves 20
+#   python benchmark_las_reader.py big_log.las image_log.las
+
+# A LAS 2.0 file of random curves, with some NULL values
+def make_las(rows, curves):
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 30, size=(rows, curves))
+    values[rng.random((rows, curves)) < 0.01] = -999.25
+    values[:, 0] = 1000 + 0.1524 * np.arange(rows)
+    mnemonics = ["DEPT"] + [f"CRV{i}" for i in range(1, curves)]
+    header = ("~VERSION INFORMATION\n VERS.   2.0 : CWLS LOG ASCII STANDARD - VERSION 2.0\n"
+              " WRAP.   NO  : ONE LINE PER DEPTH STEP\n"
+              "~WELL INFORMATION\n"
+              f" STRT.M  {values[0, 0]:.4f} :\n STOP.M  {values[-1, 0]:.4f} :\n STEP.M  0.1524 :\n"
+              " NULL.   -999.25 :\n WELL.   BENCHMARK-1 : WELL\n"
+              "~CURVE INFORMATION\n" + "".join(f" {name}.M : {name}\n" for name in mnemonics) +
+              "~A  " + " ".join(mnemonics) + "\n")
+    buffer = io.StringIO()
+    np.savetxt(buffer, values, fmt="%.4f")
+    return (header + buffer.getvalue()).encode("Windows-1252")
+
+# The reader used before: decode the whole file, then the lasio line parser
+def read_lasio(raw):
+    las = lasio.read(io.StringIO(raw.decode("Windows-1252")), engine="normal")
+    return las.df(), las
+
+# Time and peak Python memory of one reader
+def measure(reader, raw):
+    started = time.perf_counter()
+    well_data_df, _ = reader(raw)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    reader(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return well_data_df, seconds, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fast LAS reader against lasio")
+    parser.add_argument("inputs", nargs="*", help="LAS files (default: a generated file)")
+    parser.add_argument("--rows", type=int, default=200000, help="Number of depth steps of the generated file")
+    parser.add_argument("--curves", type=int, default=12, help="Number of curves of the generated file")
+    args = parser.parse_args()
+
+    files = [(path, open(path, "rb").read()) for path in args.inputs] or \
+            [(f"generated {args.rows} x {args.curves}", make_las(args.rows, args.curves))]
+    for name, raw in files:
+        fast_df, fast_seconds, fast_peak = measure(read_las, raw)
+        lasio_df, lasio_seconds, lasio_peak = measure(read_lasio, raw)
+        same = (fast_df.shape == lasio_df.shape and list(fast_df.columns) == list(lasio_df.columns)
+                and np.allclose(fast_df.index, lasio_df.index)
+                and np.allclose(fast_df.to_numpy(), lasio_df.to_numpy(), equal_nan=True))
+        print(f"{name}: {len(raw) / 1e6:.1f} MB, same data: {same}")
+        print(f"  lasio: {lasio_seconds:.2f}s, peak {lasio_peak / 1e6:.0f} MB")
+        print(f"  fast : {fast_seconds:.2f}s, peak {fast_peak / 1e6:.0f} MB -> {lasio_seconds / fast_seconds:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
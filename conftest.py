@@ -0,0 +1 @@
+# The tests import the app modules (utils, batch_export, ...) from the repository root
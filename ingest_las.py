@@ -0,0 +1,31 @@
+import time
+import argparse
+from utils.local_files import find_files
+from utils.log_store import expand_paths, ingest_las_files, load_catalog, STORE_DIR, INGEST_WORKERS
+
+# Bulk ingestion of LAS files (or zips of them, or folders) into the log store, across a process pool, without the UI.
+# The Well Logs page then opens any well of the store without parsing it again. Only the file paths are sent to the
+# workers, each worker reads its own files (nothing is held in memory by this process).
+# Example:
+#   python ingest_las.py field_logs.zip
+#   python ingest_las.py logs_folder/ extra_well.las --workers 8
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest LAS files into the log store")
+    parser.add_argument("inputs", nargs="+", help="LAS files, zip files of LAS files, or folders of them")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Number of worker processes (default: all cores)")
+    parser.add_argument("--store", default=STORE_DIR, help=f"Folder of the log store (default: {STORE_DIR})")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    las_files = expand_paths(find_files(args.inputs, (".las", ".zip")))
+    rows, errors = ingest_las_files(las_files, workers=args.workers, store_dir=args.store,
+                                    progress=lambda done, total, file_name: print(f"{done}/{total} {file_name}"))
+    for file_name, error in errors:
+        print(f"{file_name}: could not be read: {error}")
+    print(f"Ingested {len(rows)} new LAS files of {len(las_files)} ({len(errors)} errors) in "
+          f"{time.perf_counter() - started:.2f}s with {args.workers} workers. "
+          f"The store has {len(load_catalog(args.store))} LAS files")
+
+if __name__ == "__main__":
+    main()
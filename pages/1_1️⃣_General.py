@@ -1,10 +1,19 @@
 import streamlit as st
 import geopandas as gpd
 import pandas as pd
+import numpy as np
+import shapely
 import folium
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import st_folium
+from shapely import STRtree
+from scipy.spatial import cKDTree
 import os
-import tempfile
+import io
+import zipfile
+from utils.disk_cache import disk_cache, content_hash
+from utils.dataset_registry import shared_dataset, shared
+from utils.well_popups import popup_fields, build_well_popups
 
 # Magic statement to preserve widget input values across pages
 st.session_state.update(st.session_state)
@@ -37,8 +46,9 @@ tab1, tab2, tab3, tab4 = st.tabs(["✍️ General Basemap", "✍️ Well Informa
 # Create a button holder in order to delete the button after file loaded successfully
 files_uploader_holder = st.sidebar.empty()  
 
-# Key information of well for the Popup
-popup_fields = ["TD_M", "STATUS", "RESULT", "NOTES", "COMPLETED"]
+
+# Simplification tolerances (degrees) of the block outline levels of detail. Level 0 is the full resolution
+block_lod_tolerances = [0.0, 0.0005, 0.002, 0.01, 0.05]
 
 # Define style of basemap
 def basemap_style(feature):
@@ -55,43 +65,253 @@ def well_label_style(feature):
     mt_icon = folium.DivIcon(html = f"""<div style="font-family: Arial; color: blue; font-size=9px; transform: translate(-250%, 50%);
                                           white-space:nowrap;">{feature}</div>""")
     return mt_icon
+
+# Define style of the well markers and the well name labels (permanent tooltips) of the wells layer
+well_marker_style = {"color": "yellow", "fill": True, "fill_opacity": 1, "radius": 3}
+well_label_css = "font-family: Arial; color: blue; font-size: 9px; background: transparent; border: none; box-shadow: none;"
+# Define style of the offset well markers
+offset_marker_style = {"color": "cyan", "fill": True, "fill_opacity": 1, "radius": 4}
+# A click on the map opens the popup of a selected well only within this many screen pixels of the well
+click_tolerance_px = 6
+
+# Mean earth radius (km) for the great circle distances of the offset well search
+earth_radius_km = 6371.0088
  
-# Loading, caching and storing data into SS
-@st.cache_data
-def load_block_data(uploaded_files):  
+# CRS of the map (folium), all loaded data is reprojected to it once at load time
+map_crs = "EPSG:4326"
+# Equal area CRS (WGS 84 / EASE-Grid 2.0 Global) for the block areas and centroids
+equal_area_crs = "EPSG:6933"
+
+# Accepted upload types: the shapefile components, or one single-file dataset (zipped shapefile, GeoPackage, GeoParquet)
+geo_file_types = ["shp", "dbf", "prj", "shx", "cpg", "zip", "gpkg", "parquet", "geoparquet"]
+
+# Loading, caching and storing data into SS. Shared by the block and the well uploads.
+# The loaded data is shared (not copied) by all sessions opening the same upload, and also cached on disk
+# by the content of the upload, so the parsed data survives server restarts
+@shared_dataset("geo_data")
+@disk_cache("geo_data", version=2)
+def load_geo_data(uploaded_files):
+    # uploaded_files    : The list of uploaded files, read directly from memory (no temporary directory)
+    # Return the GeoDataFrame, the working file name and the loaded flag
     
     # Check if files are uploaded
     if uploaded_files:
-        # Create a temporary directory using tempfile
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            for uploaded_file in uploaded_files:
-                # Write out each uploaded file to the temporary directory
-                with open(os.path.join(tmp_dir, uploaded_file.name), 'wb') as f:
-                    f.write(uploaded_file.getbuffer())
-            # Read the shapefile from the temporary directory using geopandas
-            vnBlocks_gdf = gpd.read_file(os.path.join(tmp_dir, [file.name for file in uploaded_files if ".shp" in file.name][0]))
-            file_name1 = uploaded_files[0].name
-            vnBlocks_loaded = True  
-            # st.write("📣 :rainbow[Block shapefiles loaded, cached and stored in Session State!]")
-            return vnBlocks_gdf, file_name1, vnBlocks_loaded
+        file_name = uploaded_files[0].name
+        single_files = [file for file in uploaded_files
+                        if os.path.splitext(file.name)[1].lower() in (".zip", ".gpkg", ".parquet", ".geoparquet")]
+        if single_files:
+            # A single-file dataset is read straight from its bytes
+            file_name = single_files[0].name
+            buffer = io.BytesIO(single_files[0].getvalue())
+            if file_name.lower().endswith(("parquet", "geoparquet")):
+                geo_gdf = gpd.read_parquet(buffer)
+            else:
+                geo_gdf = gpd.read_file(buffer)
+        else:
+            # Pack the shapefile components into a zip buffer in memory, then read it as a zipped shapefile
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zip_file:
+                for uploaded_file in uploaded_files:
+                    zip_file.writestr(uploaded_file.name, uploaded_file.getbuffer())
+            buffer.seek(0)
+            geo_gdf = gpd.read_file(buffer)
+        
+        # Reproject to the map CRS once. Data without a CRS is taken as already in longitude/latitude
+        if geo_gdf.crs is None:
+            geo_gdf = geo_gdf.set_crs(map_crs)
+        elif not geo_gdf.crs.equals(map_crs):
+            geo_gdf = geo_gdf.to_crs(map_crs)
+        geo_loaded = True
+        return geo_gdf, file_name, geo_loaded
 
-@st.cache_data
-def load_well_data(uploaded_files):  
-           
-    # Check if files are uploaded
-    if uploaded_files:
-        # Create a temporary directory using tempfile
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            for uploaded_file in uploaded_files:
-                # Write out each uploaded file to the temporary directory
-                with open(os.path.join(tmp_dir, uploaded_file.name), 'wb') as f:
-                    f.write(uploaded_file.getbuffer())
-            # Read the shapefile from the temporary directory using geopandas
-            vnWells_gdf = gpd.read_file(os.path.join(tmp_dir, [file.name for file in uploaded_files if ".shp" in file.name][0]))
-            file_name2 = uploaded_files[0].name
-            vnWells_loaded = True
-            # st.write("📣 :rainbow[Well shapefiles loaded, cached and stored in Session State!]")
-            return vnWells_gdf, file_name2, vnWells_loaded    
+# Build the lookup index of blocks and wells once, right after both shapefiles are loaded
+def build_well_index(vnBlocks_gdf, vnWells_gdf):
+    # vnBlocks_gdf      : The block GeoDataFrame (polygons) with a "BLOCK_NAME" column
+    # vnWells_gdf       : The well GeoDataFrame (points) with "WELL_NAME" and "BLOCK_NAME" columns
+    # Return a dict of:
+    #   block_to_row    : block name -> row position in vnBlocks_gdf
+    #   well_to_row     : well name -> row position in vnWells_gdf
+    #   block_to_wells  : block name -> numpy array of well row positions in the block
+    #   well_block      : numpy array of the block name assigned to each well (None if no block)
+    #   block_tree      : the STRtree spatial index of the block polygons
+    #   well_lat_lon    : numpy array (n, 2) of well latitudes and longitudes for the clustered inventory layer
+    
+    block_names = vnBlocks_gdf["BLOCK_NAME"].to_numpy(dtype=object)
+    well_names = vnWells_gdf["WELL_NAME"].to_numpy(dtype=object)
+    number_of_wells = len(well_names)
+    
+    # Name to row position lookups. Keep the first row if a name is duplicated
+    block_first = ~vnBlocks_gdf["BLOCK_NAME"].duplicated().to_numpy()
+    block_to_row = dict(zip(block_names[block_first], np.flatnonzero(block_first)))
+    well_first = ~vnWells_gdf["WELL_NAME"].duplicated().to_numpy()
+    well_to_row = dict(zip(well_names[well_first], np.flatnonzero(well_first)))
+    
+    # Spatial index of the block polygons (blocks and wells are both in the map CRS since loading)
+    block_tree = STRtree(vnBlocks_gdf.geometry.values)
+    # One bulk query gives all (well position, block position) pairs where the well falls in the block
+    hit_well, hit_block = block_tree.query(vnWells_gdf.geometry.values, predicate="intersects")
+    
+    # Block found by geometry. If a well hits more than one block, keep the first hit
+    geo_block = np.full(number_of_wells, None, dtype=object)
+    geo_block[hit_well[::-1]] = block_names[hit_block[::-1]]
+    inside_any_block = np.zeros(number_of_wells, dtype=bool)
+    inside_any_block[hit_well] = True
+    
+    # The BLOCK_NAME attribute is trusted if it is a known block and the geometry agrees with it
+    # (or the well is outside all blocks). Otherwise (missing or wrong attribute) the geometric block is used
+    attr_block = vnWells_gdf["BLOCK_NAME"].to_numpy(dtype=object)
+    attr_known = vnWells_gdf["BLOCK_NAME"].isin(block_names).to_numpy()
+    attr_agree = np.zeros(number_of_wells, dtype=bool)
+    attr_agree[hit_well[block_names[hit_block] == attr_block[hit_well]]] = True
+    use_attr = attr_known & (attr_agree | ~inside_any_block)
+    well_block = np.where(use_attr, attr_block, geo_block)
+    
+    # Block name to well positions, in one groupby pass (wells without a block are dropped)
+    block_to_wells = pd.Series(well_block).groupby(well_block, sort=False, dropna=True).indices
+    
+    return {"block_to_row": block_to_row,
+            "well_to_row": well_to_row,
+            "block_to_wells": block_to_wells,
+            "well_block": well_block,
+            "block_tree": block_tree,
+            "well_lat_lon": np.column_stack([vnWells_gdf.geometry.y.to_numpy(), vnWells_gdf.geometry.x.to_numpy()])}
+        
+# Build the levels of detail of the block outlines once, right after the block shapefile is loaded
+def build_block_lod(vnBlocks_gdf):
+    # vnBlocks_gdf      : The block GeoDataFrame (polygons) with a "BLOCK_NAME" column
+    # Return a dict of tolerance -> GeoJSON string of the simplified blocks (only the names and the outlines)
+    
+    # The tolerances are in degrees, the blocks are in the map CRS since loading
+    blocks = vnBlocks_gdf[["BLOCK_NAME", "geometry"]]
+    
+    block_lod = {}
+    for tolerance in block_lod_tolerances:
+        if tolerance == 0:
+            simplified = blocks
+        elif hasattr(shapely, "coverage_simplify"):
+            # Simplify the blocks as one coverage so the shared edges of neighbouring blocks stay shared (shapely >= 2.1)
+            simplified = blocks.set_geometry(shapely.coverage_simplify(blocks.geometry.values, tolerance))
+        else:
+            simplified = blocks.set_geometry(blocks.geometry.simplify(tolerance, preserve_topology=True))
+        block_lod[tolerance] = simplified.to_json(drop_id=True)
+    return block_lod
+
+# Compute the centroid of every block in one vectorized step, once at load time
+def build_block_geometry(vnBlocks_gdf):
+    # vnBlocks_gdf      : The block GeoDataFrame (polygons) in the map CRS
+    # Return a DataFrame (same row order as vnBlocks_gdf) of centroid_lat and centroid_lon
+    
+    # Centroids are computed in an equal area CRS, then brought back to the map CRS
+    centroids = vnBlocks_gdf.geometry.to_crs(equal_area_crs).centroid.to_crs(map_crs)
+    block_geometry = pd.DataFrame({"centroid_lat": centroids.y.to_numpy(),
+                                   "centroid_lon": centroids.x.to_numpy()})
+    return block_geometry
+
+# Pick the level of detail of the block outlines for a map zoom
+def block_lod_for_zoom(block_lod, zoom):
+    # The coarsest level that is still finer than one screen pixel (256px tiles) at the zoom
+    pixel_size = 360 / (256 * 2 ** zoom)
+    tolerance = max(t for t in block_lod if t <= pixel_size)
+    return block_lod[tolerance]
+        
+# Build the well attribute table of the Well Information browser once, right after the well shapefile is loaded
+def build_well_table(vnWells_df):
+    # vnWells_df        : The well attribute DataFrame
+    # Return a dict of:
+    #   table           : the attribute table (same row order as vnWells_df), repeated text columns as categoricals
+    #   sort_index      : column -> numpy array of row positions in ascending order of the column (missing last)
+    #   ranges          : numeric column -> (min, max) for the filter sliders
+    
+    table = vnWells_df.reset_index(drop=True)
+    # Text columns with repeated values (status, result, block...) are stored as categoricals
+    text_columns = [col for col in table.columns
+                    if pd.api.types.is_object_dtype(table[col]) or pd.api.types.is_string_dtype(table[col])]
+    categorical_columns = [col for col in text_columns if table[col].nunique() <= 0.5 * len(table)]
+    table = table.astype({col: "category" for col in categorical_columns})
+    
+    sort_index = {col: table[col].sort_values(kind="stable", na_position="last").index.to_numpy() for col in table.columns}
+    ranges = {col: (float(table[col].min()), float(table[col].max()))
+              for col in table.columns if pd.api.types.is_numeric_dtype(table[col]) and table[col].notna().any()}
+    return {"table": table, "sort_index": sort_index, "ranges": ranges}
+        
+# Convert latitudes and longitudes (degrees) to 3D points on the unit sphere
+def lat_lon_to_xyz(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+# Build the KD-tree of the well locations once, right after the well shapefile is loaded.
+# The tree holds the wells as points on the unit sphere: the straight (chord) distance between two points grows with the
+# great circle (haversine) distance, so radius and nearest queries in the tree give the haversine answers
+def build_well_tree(vnWells_gdf):
+    # vnWells_gdf       : The well GeoDataFrame (points) in the map CRS
+    # Return a dict of the tree and the row positions in vnWells_gdf of the tree points (wells with a location)
+    lat = vnWells_gdf.geometry.y.to_numpy()
+    lon = vnWells_gdf.geometry.x.to_numpy()
+    positions = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    tree = cKDTree(lat_lon_to_xyz(lat[positions], lon[positions]))
+    return {"tree": tree, "positions": positions}
+
+# Find the offset wells of a location, within a radius or the k nearest ones
+def find_offset_wells(well_tree, lat, lon, radius_km=None, k=None, exclude_row=None):
+    # well_tree         : The dict from build_well_tree
+    # lat, lon          : The location (a well or a prospect)
+    # radius_km         : Find all wells within this great circle distance, or
+    # k                 : Find the k nearest wells
+    # exclude_row       : Row position of the well at the location, left out of the result
+    # Return row positions in vnWells_gdf and the distances (km), nearest first
+    tree = well_tree["tree"]
+    center = lat_lon_to_xyz([lat], [lon])[0]
+    if radius_km is not None:
+        chord = 2 * np.sin(min(radius_km / earth_radius_km, np.pi) / 2)
+        hits = np.asarray(tree.query_ball_point(center, chord), dtype=int)
+        chords = np.linalg.norm(tree.data[hits] - center, axis=1)
+    else:
+        # One more than asked, in case the well at the location is found
+        chords, hits = tree.query(center, k=min(k + 1, tree.n))
+        chords, hits = np.atleast_1d(chords), np.atleast_1d(hits)
+    distances = 2 * earth_radius_km * np.arcsin(np.clip(chords / 2, 0, 1))
+    order = np.argsort(distances, kind="stable")
+    rows, distances = well_tree["positions"][hits[order]], distances[order]
+    keep = rows != exclude_row
+    rows, distances = rows[keep], distances[keep]
+    if k is not None:
+        rows, distances = rows[:k], distances[:k]
+    return rows, distances
+
+# Get user input of the offset well search from the sidebar, and run the search
+def get_offset_input():
+    
+    with st.sidebar.expander(":arrow_down: Offset wells search"):
+        search_on = st.checkbox("👉 Search offset wells", key="tab1_offset_on")
+        around = st.radio("👉 Around", options=["A selected well", "A location (prospect)"], key="tab1_offset_around")
+        if around == "A selected well":
+            center_well = st.selectbox("👉 Well", options=ss.selected_wells, key="tab1_offset_well")
+            center_row = ss.well_index["well_to_row"].get(center_well)
+            center_lat, center_lon = ss.well_index["well_lat_lon"][center_row] if center_row is not None else (None, None)
+        else:
+            center_row = None
+            center_lat = st.number_input("👉 Latitude", min_value=-90.0, max_value=90.0, value=10.0, format="%.5f", key="tab1_offset_lat")
+            center_lon = st.number_input("👉 Longitude", min_value=-180.0, max_value=180.0, value=108.0, format="%.5f", key="tab1_offset_lon")
+        search_by = st.radio("👉 Search by", options=["Radius", "Nearest wells"], key="tab1_offset_by")
+        if search_by == "Radius":
+            radius_km = st.number_input("👉 Radius (km)", min_value=0.1, value=10.0, key="tab1_offset_radius")
+            k = None
+        else:
+            radius_km = None
+            k = st.number_input("👉 Number of wells", min_value=1, value=10, step=1, key="tab1_offset_k")
+    
+    # Run the search and keep the result (a table of the offset wells) into SS
+    offset_wells_df = None
+    if search_on and center_lat is not None:
+        rows, distances = find_offset_wells(ss.well_tree, center_lat, center_lon, radius_km=radius_km, k=k, exclude_row=center_row)
+        offset_wells_df = ss.vnWells_df.iloc[rows][["WELL_NAME"] + popup_fields].copy()
+        offset_wells_df.insert(1, "BLOCK", ss.well_index["well_block"][rows])
+        offset_wells_df.insert(2, "DISTANCE_KM", distances.round(3))
+        offset_wells_df["ROW"] = rows
+    ss.offset_wells_df = offset_wells_df
+    ss.offset_center = [center_lat, center_lon]
+    ss.offset_radius_km = radius_km
         
 # Get user input from sidebar
 def get_user_input():
@@ -100,82 +320,115 @@ def get_user_input():
     selected_block = st.sidebar.selectbox(f"📣 Found {ss.number_of_blocks} Blocks in total - 👉 Please select a Block", 
                                           ss.list_of_blocks, key = "tab1_block")
     
-    # List of wells in the selected block
-    list_of_wells = ss.vnWells_df[ss.vnWells_df["BLOCK_NAME"]==selected_block] 
+    # List of wells in the selected block, looked up from the index built at load time
+    well_positions = ss.well_index["block_to_wells"].get(selected_block, np.empty(0, dtype=int))
+    list_of_wells = ss.vnWells_df["WELL_NAME"].to_numpy()[well_positions].tolist()
     number_of_wells = len(list_of_wells)
     
     # User input of wells        
     selected_wells = st.sidebar.multiselect(f"📣 Found {number_of_wells} Wells in the Block -👉 Please select a Well", 
                                             list_of_wells, key = "tab1_wells")
     
+    # User input to show the whole well inventory as a clustered layer
+    show_all_wells = st.sidebar.checkbox("👉 Show all wells (clustered)", key = "tab1_all_wells")
+    
     # Store the input into SS
     ss.selected_block = selected_block
     ss.list_of_wells = list_of_wells
     ss.number_of_wells = number_of_wells
     ss.selected_wells = selected_wells
+    ss.show_all_wells = show_all_wells
+    
+    # Offset well search around a selected well or a location
+    get_offset_input()
     
 
 # Main working functions for each tab
 def tab1_func():
      
     # Step1: Create a Basemap (OpenStreetMap and All vnBlocks) - Using JSON method
+    # The blocks are shown from the pre-serialized level of detail matching the zoom of the map
+    zoom = ss.get("map_zoom", 10)
     m = folium.Map(location=[10.278, 108.197], ZOOM_START=3)
-    folium.GeoJson(ss.vnBlocks_gdf, style_function=basemap_style).add_to(m)   # Show all blocks
+    folium.GeoJson(block_lod_for_zoom(ss.block_lod, zoom), style_function=basemap_style).add_to(m)   # Show all blocks
 
     # Step2: Create a feature group to add to the Basemap
     feature_group = folium.FeatureGroup(name="Blocks_wells")
     
-    # Step3a: Create features for bloks (GeoJson objects)
-    for _, row in ss.vnBlocks_gdf.iterrows():
-        if row["BLOCK_NAME"] == ss.selected_block:  
-            selected_block_geojson  = folium.GeoJson(row['geometry'], style_function=selected_block_style)
-            
-            # Get center point of the block to zoom in at it's location
-            center_point = row['geometry'].centroid
-            center = [center_point.y, center_point.x]
-            selected_block_label = folium.Marker(location=[center_point.y, center_point.x], icon=well_label_style(row["BLOCK_NAME"]))
-            
-            # Step4: Use add_child() method to add features(selected block and it's label) to the feature_group
-            feature_group.add_child(selected_block_geojson)
-            feature_group.add_child(selected_block_label)
-            break
+    # Step3a: Create features for bloks (GeoJson objects). The selected block row is looked up from the index
+    block_row = ss.well_index["block_to_row"][ss.selected_block]
+    selected_block_geojson  = folium.GeoJson(ss.vnBlocks_gdf.geometry.iat[block_row], style_function=selected_block_style)
+    
+    # Get center point of the block to zoom in at it's location (precomputed at load time)
+    center = [ss.block_geometry["centroid_lat"].iat[block_row], ss.block_geometry["centroid_lon"].iat[block_row]]
+    selected_block_label = folium.Marker(location=center, icon=well_label_style(ss.selected_block))
+    
+    # Step4: Use add_child() method to add features(selected block and it's label) to the feature_group
+    feature_group.add_child(selected_block_geojson)
+    feature_group.add_child(selected_block_label)
         
-    # Step3b: Create features for wells: the symbol(folium name is marker), label(well nanme) and the popup information
-    # Note that the standard styles just work well with the add_to(m) method rather than with the st_folium()
-    for _, row in ss.vnWells_gdf.iterrows():
-        well_count = 0
-        if row["WELL_NAME"] in ss.selected_wells:          
-            # Create circle symbol for well
-            selected_well_geojson = folium.CircleMarker(location=[row.geometry.y, row.geometry.x], 
-                                                          color="yellow", fill=True, fill_opacity=1, radius=3, popup=None)
-            feature_group.add_child(selected_well_geojson)
-            
-            # Create well name feature
-            selected_well_labels = folium.Marker(location=[row.geometry.y, row.geometry.x], icon=well_label_style(row["WELL_NAME"]))
-            feature_group.add_child(selected_well_labels)
-            
-            # Create the popup feature - this also show up the default folium marker (How to turn markers off???)          
-            popup_df_temp = ss.vnWells_df[ss.vnWells_df["WELL_NAME"] == row["WELL_NAME"]]
-            popup_df = popup_df_temp[popup_fields]
-            html = popup_df.to_html(classes="table table-striped table-hover table-condensed table-responsive")
-            popup = folium.Popup(html)
-            popup_feature = folium.Marker(location=[row.geometry.y, row.geometry.x], icon_size=(5, 5), popup=popup)
-            feature_group.add_child(popup_feature)
-            
-            # Check if all matched wells added then break the loop
-            well_count = well_count + 1
-            if well_count == len(ss.selected_wells):              
-                break
+    # Step3b: Create features for wells: the symbol and the label(well name).
+    # All selected wells are emitted as ONE GeoJson layer (a FeatureCollection) rather than 3 folium objects per well.
+    # The popups are not embedded in the map: the popup of the clicked well is served from the store below the map.
+    # Only the rows of the selected wells are taken, found from the index
+    well_to_row = ss.well_index["well_to_row"]
+    selected_rows = [well_to_row[well] for well in ss.selected_wells if well in well_to_row]
+    if selected_rows:
+        selected_wells_gdf = ss.vnWells_gdf.iloc[selected_rows][["WELL_NAME", "geometry"]]
+        
+        selected_wells_geojson = folium.GeoJson(selected_wells_gdf, name="Selected wells",
+                                                marker=folium.CircleMarker(**well_marker_style),
+                                                tooltip=folium.GeoJsonTooltip(fields=["WELL_NAME"], labels=False, permanent=True,
+                                                                              direction="right", style=well_label_css))
+        feature_group.add_child(selected_wells_geojson)
+    
+    # Step3c: Show the whole well inventory at once. FastMarkerCluster builds the markers in the browser from a plain
+    # list of coordinates, so the payload is just the coordinates array
+    if ss.show_all_wells:
+        all_wells_cluster = FastMarkerCluster(ss.well_index["well_lat_lon"].tolist(), name="All wells")
+        feature_group.add_child(all_wells_cluster)
+    
+    # Step3d: Highlight the offset wells found by the search, as one GeoJson layer (and the search circle)
+    if ss.get("offset_wells_df") is not None:
+        offset_wells_gdf = ss.vnWells_gdf.iloc[ss.offset_wells_df["ROW"].to_numpy()][["WELL_NAME", "geometry"]]
+        offset_wells_gdf = offset_wells_gdf.assign(DISTANCE_KM=ss.offset_wells_df["DISTANCE_KM"].to_numpy())
+        offset_wells_geojson = folium.GeoJson(offset_wells_gdf, name="Offset wells",
+                                              marker=folium.CircleMarker(**offset_marker_style),
+                                              tooltip=folium.GeoJsonTooltip(fields=["WELL_NAME", "DISTANCE_KM"]))
+        feature_group.add_child(offset_wells_geojson)
+        if ss.offset_radius_km is not None:
+            feature_group.add_child(folium.Circle(location=ss.offset_center, radius=ss.offset_radius_km * 1000,
+                                                  color="cyan", weight=1, fill=False))
             
     # Finally, call st_folium() to show the Map. This method will not rerendering whole map. Just add more features
-    st_folium(
+    map_state = st_folium(
         m,
         center=center,
-        zoom=10,
+        zoom=zoom,
         key="new",
         feature_group_to_add=feature_group,   # Update the map
         height=720,
         width=1500)
+    
+    # Keep the zoom of the map for the level of detail of the next rerun
+    if map_state and map_state.get("zoom"):
+        ss.map_zoom = map_state["zoom"]
+    
+    # Show the popup of the clicked well (lazy, only this one is sent). The clicked well is the nearest selected well,
+    # if it is within a few screen pixels of the click (a click on a block or on the empty map opens no popup)
+    clicked = map_state.get("last_object_clicked") if map_state else None
+    if clicked and selected_rows:
+        lat_lon = ss.well_index["well_lat_lon"][selected_rows]
+        # Distances in screen pixels (web mercator: a pixel is the same in longitude, shrinks with cos(lat) in latitude)
+        pixel_size = 360 / (256 * 2 ** (map_state.get("zoom") or zoom))
+        dx = (lat_lon[:, 1] - clicked["lng"]) / pixel_size
+        dy = (lat_lon[:, 0] - clicked["lat"]) / (pixel_size * np.cos(np.radians(clicked["lat"])))
+        distance_px = np.hypot(dx, dy)
+        nearest = np.argmin(distance_px)
+        if distance_px[nearest] <= click_tolerance_px:
+            clicked_well = ss.vnWells_df["WELL_NAME"].iat[selected_rows[nearest]]
+            st.markdown(f"📣 :rainbow[Well {clicked_well}]")
+            st.markdown(ss.well_popups.get(clicked_well, ""), unsafe_allow_html=True)
         
 # This function shows full well information as a table (dataframe)
 def tab2_func():
@@ -183,11 +436,80 @@ def tab2_func():
         # Check if data loaded
         if "vnBlocks_loaded" in ss and "vnWells_loaded" in ss:
         
-            # Filter out the whole df for just selected wells only
-            selected_well_df = ss.vnWells_df[ss.vnWells_df["WELL_NAME"].isin(ss.selected_wells)]
+            # Show the offset wells found by the search, nearest first
+            if ss.get("offset_wells_df") is not None:
+                st.write(f"📣 :rainbow[Found {len(ss.offset_wells_df)} offset wells]")
+                st.dataframe(ss.offset_wells_df.drop(columns="ROW"), hide_index= True, use_container_width=True)
+            
+            well_table = ss.well_table
+            table = well_table["table"]
+            number_of_rows = len(table)
+            
+            # Create 4 columns for the browser controls
+            col1, col2, col3, col4 = st.columns(4)
+            
+            # Rows to browse: the selected wells, the wells in the selected block or all wells (row positions from the index)
+            with col1:
+                scope = st.radio("👉 Show", options=["Selected wells", "Wells in the Block", "All wells"], key="tab2_scope")
+            mask = np.zeros(number_of_rows, dtype=bool)
+            if scope == "Selected wells":
+                well_to_row = ss.well_index["well_to_row"]
+                mask[[well_to_row[well] for well in ss.selected_wells if well in well_to_row]] = True
+            elif scope == "Wells in the Block":
+                mask[ss.well_index["block_to_wells"].get(ss.selected_block, np.empty(0, dtype=int))] = True
+            else:
+                mask[:] = True
+            
+            # Column filter
+            with col2:
+                filter_col = st.selectbox("👉 Filter by", options=["(None)"] + table.columns.tolist(), key="tab2_filter_col")
+                if filter_col != "(None)":
+                    column = table[filter_col]
+                    if isinstance(column.dtype, pd.CategoricalDtype):
+                        filter_values = st.multiselect("👉 Values", options=column.cat.categories.tolist(), key="tab2_filter_values")
+                        if filter_values:
+                            mask &= column.isin(filter_values).to_numpy()
+                    elif filter_col in well_table["ranges"]:
+                        col_min, col_max = well_table["ranges"][filter_col]
+                        # A column with one value has no range to filter on (the slider needs min < max)
+                        if col_min < col_max:
+                            filter_range = st.slider("👉 Range", min_value=col_min, max_value=col_max, value=(col_min, col_max),
+                                                     key="tab2_filter_range")
+                            mask &= column.between(filter_range[0], filter_range[1]).to_numpy()
+                        else:
+                            st.write(f"📣 :rainbow[All values of {filter_col} are {col_min}]")
+                    else:
+                        filter_text = st.text_input("👉 Contains", key="tab2_filter_text")
+                        if filter_text:
+                            # Only the rows still in the mask are searched
+                            rows = np.flatnonzero(mask)
+                            found = column.iloc[rows].astype(str).str.contains(filter_text, case=False, regex=False).to_numpy()
+                            mask[:] = False
+                            mask[rows[found]] = True
+            
+            # Sorting from the precomputed sort indexes: keep the sorted positions that pass the mask
+            with col3:
+                sort_col = st.selectbox("👉 Sort by", options=table.columns.tolist(), key="tab2_sort_col")
+                descending = st.checkbox("👉 Descending", key="tab2_descending")
+            order = well_table["sort_index"][sort_col]
+            order = order[mask[order]]
+            if descending:
+                order = order[::-1]
+            
+            # Pagination, only the rows of the visible page are sent to the browser
+            with col4:
+                page_size = st.selectbox("👉 Rows per page", options=[25, 50, 100, 500], key="tab2_page_size")
+                number_of_pages = max(1, -(-len(order) // page_size))
+                # Go back to the first page if the filter left fewer pages than the current one
+                if ss.get("tab2_page", 1) > number_of_pages:
+                    ss.tab2_page = 1
+                page = st.number_input(f"👉 Page (of {number_of_pages})", min_value=1, max_value=number_of_pages, key="tab2_page")
+            start = (page - 1) * page_size
+            page_rows = order[start:start + page_size]
             
             # Show the well information
-            st.dataframe(selected_well_df, hide_index= True, use_container_width=True)
+            st.write(f"📣 :rainbow[Rows {min(start + 1, len(order))} to {start + len(page_rows)} of {len(order)} wells]")
+            st.dataframe(table.iloc[page_rows], hide_index= True, use_container_width=True)
 
 def tab3_func():
     pass
@@ -201,13 +523,15 @@ def main_entry():
         # Check if block shapefiles is already loaded
         if "vnBlocks_loaded" not in ss:
             # Create a multiple file uploader widget
-            uploaded_block_files = files_uploader_holder.file_uploader("👉 Press Ctrl to select all Block shapefiles", 
-                                                                type=["shp", "dbf", "prj", "shx"], accept_multiple_files=True)        
+            uploaded_block_files = files_uploader_holder.file_uploader("👉 Press Ctrl to select all Block shapefiles (or one zip, gpkg, parquet file)", 
+                                                                type=geo_file_types, accept_multiple_files=True)        
+            # Key of the upload content (hashed once), the derived data below is shared by all sessions with the same upload
+            blocks_key = content_hash("geo_data", uploaded_block_files) if uploaded_block_files else None
             # Load data files
-            vnBlocks_gdf, file_name1, vnBlocks_loaded = load_block_data(uploaded_block_files)
+            vnBlocks_gdf, file_name1, vnBlocks_loaded = load_geo_data(uploaded_block_files, dataset_key=blocks_key)
             
             # Convert geoPandasDataFrame to Pandas DataFrame and create some data
-            vnBlocks_df = pd.DataFrame(vnBlocks_gdf.drop(columns="geometry"), copy=True)
+            vnBlocks_df = shared(blocks_key + "/df", lambda: pd.DataFrame(vnBlocks_gdf.drop(columns="geometry"), copy=True))
             list_of_blocks = vnBlocks_df["BLOCK_NAME"].unique().tolist()
             number_of_blocks = len(list_of_blocks)
             
@@ -218,15 +542,22 @@ def main_entry():
             ss.vnBlocks_df = vnBlocks_df
             ss.list_of_blocks = list_of_blocks
             ss.number_of_blocks = number_of_blocks
+            ss.blocks_key = blocks_key
+            
+            # Pre-serialize the simplified block outlines once for the basemap
+            ss.block_lod = shared(blocks_key + "/block_lod", build_block_lod, vnBlocks_gdf)
+            # Centroids of all blocks, for the zoom to block
+            ss.block_geometry = shared(blocks_key + "/block_geometry", build_block_geometry, vnBlocks_gdf)
         
             # Check if well shapefiles is already loaded
         if "vnBlocks_loaded" in ss and "vnWells_loaded" not in ss:
             # Create a multiple file uploader widget
-            uploaded_well_files = files_uploader_holder.file_uploader("👉 Press Ctrl to select all Well shapefiles", 
-                                                                type=["shp", "dbf", "prj", "shx"], accept_multiple_files=True)                  
+            uploaded_well_files = files_uploader_holder.file_uploader("👉 Press Ctrl to select all Well shapefiles (or one zip, gpkg, parquet file)", 
+                                                                type=geo_file_types, accept_multiple_files=True)                  
             # Load data files
-            vnWells_gdf, file_name2, vnWells_loaded = load_well_data(uploaded_well_files)
-            vnwells_df = pd.DataFrame(vnWells_gdf.drop(columns="geometry"), copy=True)
+            wells_key = content_hash("geo_data", uploaded_well_files) if uploaded_well_files else None
+            vnWells_gdf, file_name2, vnWells_loaded = load_geo_data(uploaded_well_files, dataset_key=wells_key)
+            vnwells_df = shared(wells_key + "/df", lambda: pd.DataFrame(vnWells_gdf.drop(columns="geometry"), copy=True))
             
             # Store data into SS
             ss.vnWells_loaded = vnWells_loaded
@@ -234,6 +565,12 @@ def main_entry():
             ss.vnWells_gdf = vnWells_gdf 
             ss.vnWells_df = vnwells_df
             
+            # Build the block/well lookup and spatial index once, so the sidebar and the map never scan all wells
+            ss.well_tree = shared(wells_key + "/tree", build_well_tree, vnWells_gdf)
+            ss.well_table = shared(wells_key + "/table", build_well_table, vnwells_df)
+            ss.well_popups = shared(wells_key + "/popups", build_well_popups, vnwells_df)
+            ss.well_index = shared(ss.blocks_key + "/" + wells_key + "/well_index", build_well_index, ss.vnBlocks_gdf, vnWells_gdf)
+            
         # Display working data files
         st.write(f"📣 :rainbow[The working files: {ss.file_name1} and  {ss.file_name2}]") 
                       
@@ -1,7 +1,13 @@
 import streamlit as st
-import pandas as pd
+import io
+import threading
+from collections import OrderedDict
 import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
+from utils.disk_cache import disk_cache, content_hash
+from utils.dataset_registry import shared_dataset, shared
+from utils.well_plots import well_top, well_dst, well_correlation
+from utils.top_dst_data import read_top_dst, partition_by_well, rows_in_depth_window, empty_partition
+from utils.deviation_survey import read_surveys, build_surveys, vertical_depth_view, vertical_modes
 
 # Magic statement to preserve widget input values across pages
 st.session_state.update(st.session_state)
@@ -29,112 +35,73 @@ st.markdown("<style>div.block-container{padding-top:0.5rem;}</style>", unsafe_al
 st.markdown("<span style='color: yellow; font-size:45px; font-weight: bold;'> Well DSTs and Tops </span>", unsafe_allow_html=True)
 
 # Create some tabs
-tab1, tab2, tab3, tab4 = st.tabs(["✍️ Plot Well Tops and DSTs", "✍️ Data file example", "✍️ Help", "✍️ About"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["✍️ Plot Well Tops and DSTs", "✍️ Well Correlation", "✍️ Data file example", "✍️ Help", "✍️ About"])
 
-def well_top(df, start_depth, stop_depth, name_col, depth_col):
-    # df                : The input pandas dataframe
-    # top_depth_col     : Column of the top depth of DST in measure depth(md)
-    # base_depth_col    : Column of the base depth of DST 
-    # name_col          : Column of the DST number
-    # start_depth       : Start depth(md) of borehole to plot
-    # stop_depth        : Stop depth of borehole to plot        
-    
-    # fig, ax = plt.subplots(figsize=(3, 5)) # The default: W=6.4in=640px; H=4.8in=480px
-    # Create a figure and a axis.        
-    fig, ax = plt.subplots()
-    
-    # Plot a wellbore with depth from start_depth to TD
-    ax.axhspan(start_depth, stop_depth, 0.2, 0.4, color="brown", alpha=1, label= "Wellbore")
-    # Set y-axis limit
-    plt.ylim(start_depth, stop_depth)    
-    # Plot Tops
-    for i in range(len(df)):
-        # Get value at row i, depth_col for depths (md)
-        ax.axhline(y=df.iloc[i,depth_col], xmin=0.2, xmax=0.4, color="yellow")
-        # Get value at row i, name_col for top names
-        # ax.text(0.5, df.iloc[i,depth_col], (df.iloc[i, name_col] + " @ "+ str(df.iloc[i,depth_col])), ha='left', va='center')
-        ax.text(0.5, df.iloc[i,depth_col], (df.iloc[i, name_col]), ha='left', va='center')
-    # Invert y axis
-    ax.invert_yaxis()
-    
-    # Set background color
-    ax.set_facecolor("pink")
-    
-    # Turn off x ticks and it's labels
-    ax.xaxis.set_major_locator(ticker.NullLocator())
-    
-    # Add legend
-    ax.legend(loc="upper right")
-    
-    # Set y-axis label position to the right
-    ax.yaxis.set_label_position("right")
-    
-    # Set y-axis label
-    ax.set_ylabel("Depth (MDm)")
-    
-    # Set x-axis label
-    ax.set_xlabel("Plot depth from " + str(start_depth) + " to " + str(stop_depth) + "m")   
-           
-    return fig
+# Size limit of the rendered plot images kept in memory (for all sessions)
+render_cache_max_bytes = 64 * 1024 * 1024
 
-def well_dst(df, start_depth, stop_depth, top_depth_col, base_depth_col, name_col):
-    # df                : The input pandas dataframe
-    # top_depth_col     : Column of the top depth of DST in measure depth(md)
-    # base_depth_col    : Column of the base depth of DST 
-    # name_col          : Column of the DST number
-    # start_depth       : Start depth(md) of borehole to plot
-    # stop_depth        : Stop depth of borehole to plot  
-    
-    # Create default figure and ax (Figure size will be: W=6.4in=640px; H=4.8in=480px)
-    fig, ax = plt.subplots()
-    
-    # Plot a wellbore with depth from start_depth to TD
-    ax.axhspan(start_depth, stop_depth, 0.2, 0.4, color="brown", alpha=1, label= "Wellbore")        
-    # Set y-axis limit
-    plt.ylim(start_depth, stop_depth)
-    # Plot DSTs
-    for i in range(len(df)):
-        ax.axhspan(ymin=df.iloc[i,top_depth_col], ymax=df.iloc[i, base_depth_col], xmin=0.2, xmax=0.4, color="yellow",
-                   alpha=1, label = "Dst" + str(df.iloc[i, name_col]))               
-    # Invert y axis
-    ax.invert_yaxis()
-    
-    # Set background color
-    ax.set_facecolor("pink")
-    
-    # Turn off x ticks and it's labels
-    ax.xaxis.set_major_locator(ticker.NullLocator())
-    
-    # Add legend
-    ax.legend(loc="upper right")
-    
-    # Set y-axis label position to the right
-    ax.yaxis.set_label_position("right")
-    
-    # Set y-axis label
-    ax.set_ylabel("Depth (MDm)")
+# One cache of the rendered plots (PNG bytes) for the whole server process, least recently used first
+@st.cache_resource
+def get_render_cache():
+    return {"lock": threading.Lock(), "images": OrderedDict(), "nbytes": 0}
+
+# Get the PNG image of a plot from the render cache, or render it. The figure is closed as soon as it is encoded
+def render_png(key, plot_func, *args):
+    # key               : The cache key, e.g. (dataset, plot type, well, start depth, stop depth)
+    # plot_func         : The plot function returning a matplotlib figure, called as plot_func(*args)
+    cache = get_render_cache()
+    with cache["lock"]:
+        png = cache["images"].get(key)
+        if png is not None:
+            cache["images"].move_to_end(key)
+            return png
     
-    # Set x-axis label
-    ax.set_xlabel("Plot depth from " + str(start_depth) + " to " + str(stop_depth) + "m")     
-          
-    return fig
+    fig = plot_func(*args)
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        png = buffer.getvalue()
+    finally:
+        plt.close(fig)
     
-@st.cache_data # Load data, cache and store into Session State(SS)
-def load_data(uploaded_file):
-    if uploaded_file:
-        
-        # Read only sheets named "well_top" and "well_dst"
-        df_well_top = pd.read_excel(uploaded_file, sheet_name="well_top")
-        df_well_dst = pd.read_excel(uploaded_file, sheet_name="well_dst")
-        
-        # Sort the dataframes
-        df_well_top = df_well_top.sort_values(["well_name", "surface_md_m"], ascending = [True, True])
-        df_well_dst = df_well_dst.sort_values(["well_name", "dst_number"], ascending = [True, True])
-        
-        file_loaded = True
-        return df_well_top, df_well_dst, file_loaded
+    with cache["lock"]:
+        if key not in cache["images"]:
+            cache["images"][key] = png
+            cache["nbytes"] = cache["nbytes"] + len(png)
+        # Evict the least recently used images over the size limit
+        while cache["nbytes"] > render_cache_max_bytes and len(cache["images"]) > 1:
+            _, old_png = cache["images"].popitem(last=False)
+            cache["nbytes"] = cache["nbytes"] - len(old_png)
+    return png
+
+@shared_dataset("well_top_dst") # Load data once for all sessions (shared, not copied), and store into Session State(SS)
+@disk_cache("well_top_dst", version=2) # Also cache on disk by the content of the upload, across server restarts
+def load_data(uploaded_files):
+    # uploaded_files    : One Excel workbook with the sheets "well_top" and "well_dst", or two CSV/Parquet files
+    #                     with "well_top" and "well_dst" in their names
+    return read_top_dst(uploaded_files)
+
+@shared_dataset("deviation_survey") # Load the surveys once for all sessions (shared, not copied)
+@disk_cache("deviation_survey", version=1) # Also cache on disk by the content of the upload, across server restarts
+def load_surveys(uploaded_files):
+    # uploaded_files    : Excel workbook(s) with a sheet "deviation_survey", or CSV/Parquet survey files
+    return read_surveys(uploaded_files)
+
+# Get the tops and DSTs of all wells in a depth type: the loaded tables for MD, or the tables converted to TVD/TVDSS
+# with the deviation surveys. A converted view is built once (for all sessions), then switching is instant
+def get_depth_view(depth_type):
+    if depth_type == "MD":
+        return {"df_top": ss.df_well_top, "df_dst": ss.df_well_dst,
+                "depth_cols": ("surface_md_m", "dst_depth_top_m", "dst_depth_base_m"),
+                "top_partitions": ss.top_partitions, "dst_partitions": ss.dst_partitions}
+    return shared(f"{ss.top_dst_key}/{ss.survey_key}/{depth_type}", vertical_depth_view,
+                  ss.df_well_top, ss.df_well_dst, ss.surveys, depth_type)
+
+# Key of the depths of the plots: the depth type, and the deviation surveys for TVD/TVDSS (the rendered plots are
+# shared by all sessions, so plots of other surveys must not be reused)
+def depth_key():
+    return (ss.depth_type, None if ss.depth_type == "MD" else ss.survey_key)
 
-        
 # Get user input from sidebar
 def get_user_input():
       
@@ -146,12 +113,27 @@ def get_user_input():
     number_of_wells_has_dst = len(ss.unique_well_dst)
     selected_well_has_dst = st.sidebar.selectbox(f"📣 Found {number_of_wells_has_dst} Well with DSTs - Select one", 
                                                  ss.unique_well_dst, key = "tab1_select2")
+    # Depth type of the plots, TVD and TVDSS need the deviation surveys
+    if "surveys" in ss:
+        depth_type = st.sidebar.radio("👉 Depth", options=["MD"] + vertical_modes, horizontal=True, key="tab1_depth_type")
+    else:
+        depth_type = "MD"
+    
     # Store the input into SS
     ss.selected_well_has_top = selected_well_has_top
     ss.selected_well_has_dst = selected_well_has_dst
+    ss.depth_type = depth_type
    
 # Main body
 def tab1_func():     
+    
+    # Tops and DSTs in the selected depth type
+    view = get_depth_view(ss.depth_type)
+    depth_label = f"Depth ({ss.depth_type}m)"
+    if ss.depth_type != "MD":
+        missing = [well for well in {ss.selected_well_has_top, ss.selected_well_has_dst} if well not in ss.surveys]
+        if missing:
+            st.write(f"📣 :rainbow[No deviation survey for {', '.join(map(str, missing))}, its depths can not be shown in {ss.depth_type}]")
        
     # Create 2 columns below above row in the Main page
     col1, col2 = st.columns(2)
@@ -162,15 +144,17 @@ def tab1_func():
         # Setup range of the depth
         depth_range1 = st.slider("👉 Select depth range for Tops", value = [500.0, 5500.0])
         
-        # Create a dataframe for plotting tops
-        show_df1 = ss.df_well_top[ss.df_well_top["well_name"] == ss.selected_well_has_top]
-        show_df1 = show_df1.sort_values(by="surface_md_m", ascending=True)
+        # Create a dataframe for plotting tops: only the tops of the well inside the depth range
+        partition = view["top_partitions"].get(ss.selected_well_has_top) or empty_partition(view["df_top"])
+        show_df1 = rows_in_depth_window(partition, depth_range1[0], depth_range1[1])
                 
-        # Call well_top function
-        my_fig = well_top(show_df1, depth_range1[0], depth_range1[1], 1, 3)
+        # Call well_top function, or get the plot from the render cache
+        render_key = (ss.top_dst_key, "well_top", ss.selected_well_has_top, depth_range1[0], depth_range1[1], depth_key())
+        depth_col = view["df_top"].columns.get_loc(view["depth_cols"][0])
+        my_png = render_png(render_key, well_top, show_df1, depth_range1[0], depth_range1[1], 1, depth_col, depth_label)
                         
         # Show the matplotlib plot on col2
-        st.pyplot(my_fig)
+        st.image(my_png, use_column_width=True)
         
         # Show the data as a table
         df1a = show_df1.iloc[:, 1:]
@@ -184,30 +168,63 @@ def tab1_func():
         # Setup range of the depth
         depth_range2 = st.slider("👉 Select depth range for DSTs", value = [500.0, 5500.0])
         
-        # Create a dataframe for plotting dsts
-        show_df2 = ss.df_well_dst[ss.df_well_dst["well_name"] == ss.selected_well_has_dst]
+        # Create a dataframe for plotting dsts: only the DSTs of the well inside the depth range
+        partition = view["dst_partitions"].get(ss.selected_well_has_dst) or empty_partition(view["df_dst"])
+        show_df2 = rows_in_depth_window(partition, depth_range2[0], depth_range2[1])
                 
-        # Call well_dst
-        my_fig = well_dst(show_df2, depth_range2[0], depth_range2[1], 3, 4, 2)
+        # Call well_dst, or get the plot from the render cache
+        render_key = (ss.top_dst_key, "well_dst", ss.selected_well_has_dst, depth_range2[0], depth_range2[1], depth_key())
+        top_col, base_col = (view["df_dst"].columns.get_loc(col) for col in view["depth_cols"][1:])
+        my_png = render_png(render_key, well_dst, show_df2, depth_range2[0], depth_range2[1], top_col, base_col, 2, depth_label)
                
         # Show the matplotlib plot on col2
-        st.pyplot(my_fig)
+        st.image(my_png, use_column_width=True)
         
         # Show the data as a table
         df2a = show_df2.iloc[:, 2:]
         #st.write(df2a)
         st.dataframe(df2a, width=640, height=350)
         
+# Correlation panel of many wells side by side
+def tab2_func():
+    
+    # Create 3 columns for the panel setup
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        wells = st.multiselect("👉 Select the wells to correlate (left to right)", ss.unique_well_top,
+                               default=ss.unique_well_top[:20], key="tab2_wells")
+    with col2:
+        surfaces = ss.df_well_top["surface_name"].dropna().unique().tolist()
+        flatten_on = st.selectbox("👉 Flatten on", options=["(None)"] + surfaces, key="tab2_flatten")
+        flatten_on = None if flatten_on == "(None)" else flatten_on
+    with col3:
+        if flatten_on is None:
+            depth_range = st.slider("👉 Depth range", value=[500.0, 5500.0], key="tab2_depth")
+        else:
+            depth_range = st.slider("👉 Depth range (relative)", min_value=-3000.0, max_value=3000.0, value=[-500.0, 500.0],
+                                    key="tab2_depth_flat")
+    
+    if wells:
+        # Call well_correlation, or get the panel from the render cache. The wells are compared in the selected depth type
+        view = get_depth_view(ss.depth_type)
+        render_key = (ss.top_dst_key, "well_correlation", tuple(wells), flatten_on, depth_range[0], depth_range[1], depth_key())
+        my_png = render_png(render_key, well_correlation, view["df_top"], view["df_dst"], wells,
+                            depth_range[0], depth_range[1], flatten_on, view["depth_cols"], ss.depth_type)
+        st.image(my_png)
+
 def main_entry():
     text_message = ''':rainbow[👉 Please select and load an Excel data file - 
-    The file must has two sheets named "well_top" and "well_dst"]:hibiscus:'''
+    The file must has two sheets named "well_top" and "well_dst" (or two CSV/Parquet files named with "well_top" and "well_dst")]:hibiscus:'''
     
     try:
         if "file_loaded" not in ss:
             # Create a file uploader widget
-            uploaded_file = st.sidebar.file_uploader("👉 Please select a Exel data file", type=["xls", "xlsx"], accept_multiple_files=False)  
+            uploaded_files = st.sidebar.file_uploader("👉 Please select a Exel data file (or CSV/Parquet files)", 
+                                                      type=["xls", "xlsx", "xlsm", "csv", "parquet"], accept_multiple_files=True)  
+            # Key of the upload content (hashed once), for the loader, the render cache and the shared partitions
+            top_dst_key = content_hash("well_top_dst", uploaded_files) if uploaded_files else None
             # load_excel data file
-            df_well_top, df_well_dst, file_loaded = load_data(uploaded_file)
+            df_well_top, df_well_dst, file_loaded = load_data(uploaded_files, dataset_key=top_dst_key)
             
             # Get unique blocks and wells
             unique_well_top = df_well_top["well_name"].unique().tolist()
@@ -219,7 +236,17 @@ def main_entry():
             ss.unique_well_top = unique_well_top
             ss.unique_well_dst = unique_well_dst
             ss.file_loaded = file_loaded
+            ss.top_dst_key = top_dst_key
+            
+            # Partition the tops and DSTs by well, sorted by depth, once for all sessions
+            ss.top_partitions = shared(ss.top_dst_key + "/top_partitions", partition_by_well, df_well_top, "surface_md_m")
+            ss.dst_partitions = shared(ss.top_dst_key + "/dst_partitions", partition_by_well, df_well_dst,
+                                       "dst_depth_top_m", "dst_depth_base_m")
             
+    except ValueError as e:
+        # The uploaded data does not match the expected sheets or columns
+        st.markdown(text_message)
+        st.error(f"📣 The data file could not be loaded: {e}")
     except Exception as e:
         # Ignore the error of the first run, when user has not select the files to upload
         st.markdown(text_message)
@@ -227,6 +254,21 @@ def main_entry():
         # Populate a message of loading data problem
         # st.write(e)
         
+    # Optional deviation surveys (sheet "deviation_survey" or survey files), for the TVD and TVDSS depths
+    try:
+        if "file_loaded" in ss and "surveys" not in ss:
+            survey_files = st.sidebar.file_uploader("👉 Deviation surveys (optional, for TVD/TVDSS)", 
+                                                    type=["xls", "xlsx", "xlsm", "csv", "parquet"], accept_multiple_files=True)
+            survey_key = content_hash("deviation_survey", survey_files) if survey_files else None
+            df_survey = load_surveys(survey_files, dataset_key=survey_key)
+            if df_survey is not None:
+                ss.survey_key = survey_key
+                # The well paths are computed once for all sessions
+                ss.surveys = shared(ss.survey_key + "/surveys", build_surveys, df_survey)
+    except ValueError as e:
+        # The uploaded surveys do not match the expected sheet or columns
+        st.sidebar.error(f"📣 The deviation surveys could not be loaded: {e}")
+        
     # User input from the sidebar
     try:
         get_user_input()
@@ -243,17 +285,24 @@ def main_entry():
             st.write(e)
 
     with tab2:
+        try:
+            if "file_loaded" in ss:
+                tab2_func()
+        except Exception as e:
+            st.write(e)
+
+    with tab3:
         st.write("📣 :rainbow[This is an example Excel sheet of the input well top data]")
         st.image(r"./images/well_top_example.PNG")
         st.write("📣 :rainbow[This is an example Excel sheet of the input well DST data]")
         st.image(r"./images/well_dst_example.PNG")
         text_message = ''':rainbow[👉 Please select a desired TAB above for more information]:hibiscus:'''
         
-    with tab3:
+    with tab4:
         st.write("Welcome to the Help TAB - Under construction")
         text_message = ''':rainbow[👉 Please select a desired TAB above for more information]:hibiscus:'''
         
-    with tab4:
+    with tab5:
         st.write("Welcome to the About TAB - Under construction")
         text_message = ''':rainbow[👉 Please select a desired TAB above for more information]:hibiscus:'''
         
@@ -1,10 +1,26 @@
+import os
+import json
 import streamlit as st
 import plotly.express as px
-import lasio
-from io import StringIO
+import plotly.graph_objects as go
+import numpy as np
 import pandas as pd
-from streamlit_pandas_profiling import st_profile_report
+import streamlit.components.v1 as components
 from ydata_profiling import ProfileReport
+from utils.disk_cache import disk_cache, content_hash
+from utils.top_dst_data import label_depth_samples
+from utils.deviation_survey import md_to_vertical, vertical_modes
+from utils.las_reader import read_las, las_header_tables, memory_report
+from utils.curve_stats import curve_stats, slider_range
+from utils.log_eda import cached_eda, eda_max_rows
+from utils.cross_plot import window_rows, density_image, svg_max_points, webgl_max_points
+from utils.dataset_registry import shared_dataset, shared, release_shared
+from utils.log_store import expand_uploads, ingest_las_files, load_catalog, read_log, read_headers
+from utils.job_queue import get_job_queue, job_id_of
+
+# File names of the ydata report and of the ingestion result in the folder of their jobs
+profile_report_file = "profile_report.html"
+ingest_result_file = "ingest_result.json"
 
 # Magic statement to preserve absolutely all widget input values across pages
 # but it does not work with st.form. If disable this statement, only slider values are not preserved.
@@ -36,73 +52,231 @@ st.markdown("<span style='color: yellow; font-size:45px; font-weight: bold;'> We
 # Create some tabs
 tab1, tab2, tab3, tab4 = st.tabs(["✍️ Exploration Data Analysis", "✍️ Well Information", "✍️ Curve Cross Plot", "✍️ About"])
     
-@st.cache_data # Load data
+@shared_dataset("las") # Load data once for all sessions (shared, not copied)
+@disk_cache("las", version=3) # Also cache on disk by the content of the upload, across server restarts
 def load_data(uploaded_file):
 
     # Check if files are uploaded
     if uploaded_file:
-        # Read the uploaded file as a string
-        las_str = uploaded_file.getvalue().decode(('Windows-1252'))
-        # Create a StringIO object from the string
-        las_file = StringIO(las_str)
-        las = lasio.read(las_file, engine='normal')
-        # Convert las to df
-        well_data_df = las.df()                 
+        # Read the uploaded file: the headers by lasio, the data section by the fast numeric reader (lasio for the
+        # files it can not read)
+        well_data_df, las = read_las(uploaded_file.getvalue())
         
-        # Have to use try-exception for each header section due to header of las file is very offen get error during parsing      
         try:       
             # Then we need convert index to column data
             well_data_df.reset_index(inplace=True)     # -> This is a dataframe of all well log data values     
         except:
             pass    
-        try:        
-            # Convert each header section to a dataframe
-            well_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Value': item.value, 'Description': item.descr}
-                      for item in las.well]
-            well_header_df = pd.DataFrame(well_header).astype(str)   # -> This is a dataframe of all well information
-            # Dig out well name 
-            well_name = well_header_df.loc[well_header_df["Name"]=="WELL", "Value"].values[0]
-            # If there is no well name in the header, let it to be the working file name
-            if not well_name:
-                well_name = uploaded_file.name
-        except:
-            pass
-        
-        try:
-            #Convert well curve section to a dataframe
-            curves_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Description': item.descr, 
-                              'Original name': item.original_mnemonic, 'Number of points': item.data.shape[0]}
-                      for item in las.curves]
-            curves_header_df = pd.DataFrame(curves_header).astype(str)   # -> This is a dataframe of all curve information
-        except:
-            pass
-        
-        try:
-            # Convert well params section to a dataframe
-            parameter_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Value': item.value, 'Description': item.descr}
-                      for item in las.params]
-            parameter_header_df = pd.DataFrame(parameter_header).astype(str)   # -> This is a dataframe of all parameter information
-        except:
-            parameter_header_df = []
-            pass
-        
-        try:
-            # Convert well other section to a dataframe
-            other_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Value': item.value, 'Description': item.descr}
-                      for item in las.other]
-            other_header_df = pd.DataFrame(other_header).astype(str)   # -> This is a dataframe of all other information
-        except:
-            other_header_df = []
-            pass
+        # Convert the header sections to dataframes
+        well_header_df, well_name, curves_header_df, parameter_header_df, other_header_df = \
+            las_header_tables(las, well_data_df, uploaded_file.name)
         
         return well_data_df, well_header_df, well_name, curves_header_df, parameter_header_df, other_header_df
        
+# Identity of an uploaded file (no hashing of the content, the files stay in the uploader over the reruns)
+def upload_id(uploaded_file):
+    return (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, "file_id", ""))
+
+# Ingest LAS files into the log store in a worker of the job queue (the files are parsed across a process pool).
+# The numbers of files and the errors are written as a JSON file of the job
+def ingest_job(job, las_files):
+    # job               : The job (see utils.job_queue)
+    # las_files         : List of (file name, bytes) from expand_uploads
+    job.progress(0.0, f"Ingesting {len(las_files)} LAS files")
+    rows, errors = ingest_las_files(las_files, progress=lambda done, total, file_name:
+                                    job.progress(done / total, f"{done}/{total} - {file_name}"))
+    with open(job.path(ingest_result_file), "w", encoding="utf-8") as f:
+        json.dump({"files": len(las_files), "new": len(rows), "errors": errors}, f)
+
+# Ingest many LAS files (or zips of them) into the log store in the background. Runs once per upload
+def ingest_uploads(uploaded_files):
+    
+    ingested = ss.setdefault("ingested_uploads", set())
+    new_files = [uploaded_file for uploaded_file in uploaded_files if upload_id(uploaded_file) not in ingested]
+    if not new_files:
+        return
+    upload_ids = sorted(upload_id(uploaded_file) for uploaded_file in new_files)
+    ss.ingest_job_id = get_job_queue().submit("ingest", upload_ids, ingest_job, expand_uploads(new_files),
+                                              title=f"Ingestion of {len(new_files)} uploaded files")
+    ss.ingest_upload_ids = upload_ids
+    ingested.update(upload_ids)
+
+# Progress and result of the last ingestion of the session, in the sidebar. The page stays usable while it runs
+def show_ingest_job():
+    
+    queue = get_job_queue()
+    status = queue.status(ss.ingest_job_id)
+    if status is None:
+        return
+    
+    # Running: progress, a button to check again, and a button to cancel
+    if status["state"] in ["queued", "running"]:
+        st.sidebar.progress(status["progress"], text=f"⏳ {status['message']}")
+        col1, col2 = st.sidebar.columns(2)
+        col1.button("🔄 Check", key="ingest_refresh")
+        if col2.button("✋ Cancel", key="ingest_cancel"):
+            queue.cancel(ss.ingest_job_id)
+            st.rerun()
+    
+    # Done: the numbers of files and the errors
+    elif status["state"] == "done":
+        with open(os.path.join(queue.folder(ss.ingest_job_id), ingest_result_file), encoding="utf-8") as f:
+            result = json.load(f)
+        st.sidebar.write(f"📣 :rainbow[{result['new']} new LAS files added to the log store, "
+                         f"{result['files'] - result['new'] - len(result['errors'])} already in it]")
+        for file_name, error in result["errors"]:
+            st.sidebar.error(f"📣 {file_name} could not be read: {error}")
+    
+    # Cancelled or failed: the files done before are in the store. The uploads can be ingested again
+    else:
+        st.sidebar.write(f"📣 :rainbow[The ingestion was {status['state']}] {status['error']}")
+        if st.sidebar.button("🔁 Ingest again", key="ingest_again"):
+            ss.ingested_uploads.difference_update(ss.ingest_upload_ids)
+            queue.remove(ss.ingest_job_id)
+            st.rerun()
+
+# Read one LAS file of the log store: the data and the header tables, in the order of load_data
+def load_store_log(log_id):
+    well_header_df, curves_header_df, parameter_header_df, other_header_df = read_headers(log_id)
+    return read_log(log_id), well_header_df, curves_header_df, parameter_header_df, other_header_df
+
+# Let go of the log the session worked with: its shared datasets (the log, its curve statistics and EDA) can then be
+# evicted from the registry, and the data derived from it in SS (density image, labels, vertical depths) is dropped
+def forget_log():
+    if "las_key" in ss:
+        release_shared(ss.las_key)
+    derived_keys = ["density_image", "density_image_key", "depth_labels", "depth_labels_key", "vertical_depths",
+                    "vertical_depths_key", "vertical_depth_stats", "x1", "y1", "z"]
+    # Also forget the curve choices of the log
+    for key in derived_keys + [key for key in ss if str(key).startswith("slider")]:
+        ss.pop(key, None)
+
+# Pick a LAS file of the log store to work with. The data are read from Parquet once (shared by all sessions),
+# nothing is parsed again
+def open_store_log():
+    
+    catalog = load_catalog()
+    if catalog.empty:
+        return
+    labels = dict(zip(catalog["log_id"], catalog["well_name"] + " (" + catalog["file_name"] + ")"))
+    log_id = st.sidebar.selectbox(f"📣 Found {catalog['well_name'].nunique()} Wells in the log store - Open one", 
+                                  options=["(None)"] + catalog["log_id"].tolist(), format_func=lambda x: labels.get(x, x),
+                                  key="log_store_log")
+    if log_id == "(None)" or ss.get("las_key") == "log_store/" + log_id:
+        return
+    
+    forget_log()
+    well_data_df, well_header_df, curves_header_df, parameter_header_df, other_header_df = \
+        shared("log_store/" + log_id, load_store_log, log_id)
+    # Store data into SS
+    ss.df_for_plot = well_data_df
+    ss.well_header_df = well_header_df
+    ss.well_name = catalog.loc[catalog["log_id"] == log_id, "well_name"].iloc[0]
+    ss.curves_header_df = curves_header_df
+    ss.parameter_header_df = parameter_header_df
+    ss.other_header_df = other_header_df
+    ss.las_key = "log_store/" + log_id
+
+# Factor from the log depth unit to meters. The depth is the first curve of the log
+def log_depth_factor():
+    depth_unit = str(ss.curves_header_df["Unit"].iloc[0]).strip().upper() if len(ss.curves_header_df) else ""
+    return 0.3048 if depth_unit in ("F", "FT", "FEET") else 1.0
+
+# Label every log sample with its formation and DST, from the tops and DSTs loaded in the DSTs and Tops page
+def get_depth_labels():
+    
+    # The tops and DSTs must be loaded (in the DSTs and Tops page) in this session
+    if "top_partitions" not in ss:
+        return None
+    
+    # Pick the well of the tops/DSTs for the log. The default is the well with the same name as the LAS well
+    wells = sorted(set(ss.top_partitions) | set(ss.dst_partitions))
+    matching = [well for well in wells if str(well).strip().upper() == str(ss.well_name).strip().upper()]
+    with st.sidebar.expander(":arrow_down: Formation tops and DSTs"):
+        tops_well = st.selectbox("👉 Well of the tops and DSTs", options=["(None)"] + wells,
+                                 index=wells.index(matching[0]) + 1 if matching else 0, key="log_tops_well")
+    if tops_well == "(None)":
+        return None
+    
+    # Labels are computed once per (log, tops data, well) and kept into SS
+    labels_key = (ss.las_key, ss.top_dst_key, tops_well)
+    if ss.get("depth_labels_key") != labels_key:
+        # The depth is the first column of the log. Tops and DSTs are in meters, convert the log depth if in feet
+        depths = ss.df_for_plot.iloc[:, 0].to_numpy(dtype=float) * log_depth_factor()
+        ss.depth_labels = label_depth_samples(depths, ss.top_partitions.get(tops_well), ss.dst_partitions.get(tops_well))
+        ss.depth_labels_key = labels_key
+    return ss.depth_labels
+    
+# Convert all the log depths to TVD and TVDSS with the deviation survey loaded in the DSTs and Tops page, and get the
+# depth type to show
+def get_vertical_depths():
+    
+    ss.log_depth_type = "MD"
+    # The surveys must be loaded (in the DSTs and Tops page) in this session
+    if "surveys" not in ss:
+        return
+    
+    # Pick the survey of the log, and the depth type. The default is the survey of the well with the same name
+    wells = sorted(ss.surveys)
+    matching = [well for well in wells if str(well).strip().upper() == str(ss.well_name).strip().upper()]
+    with st.sidebar.expander(":arrow_down: Deviation survey (TVD)"):
+        survey_well = st.selectbox("👉 Well of the deviation survey", options=["(None)"] + wells,
+                                   index=wells.index(matching[0]) + 1 if matching else 0, key="log_survey_well")
+        depth_type = st.radio("👉 Depth", options=["MD"] + vertical_modes, horizontal=True, key="log_depth_type_radio")
+    if survey_well == "(None)":
+        return
+    
+    # All samples are converted at once, for both TVD and TVDSS, once per (log, surveys, well) and kept into SS.
+    # The converted depths are in the unit of the log depth
+    depths_key = (ss.las_key, ss.survey_key, survey_well)
+    if ss.get("vertical_depths_key") != depths_key:
+        factor = log_depth_factor()
+        depths = ss.df_for_plot.iloc[:, 0].to_numpy(dtype=float) * factor
+        ss.vertical_depths = {mode: md_to_vertical(ss.surveys[survey_well], depths, mode) / factor for mode in vertical_modes}
+        ss.vertical_depth_stats = curve_stats(pd.DataFrame(ss.vertical_depths))
+        ss.vertical_depths_key = depths_key
+    ss.log_depth_type = depth_type
+
+# Values of a curve to plot. The depth curve is given in the selected depth type (MD, TVD or TVDSS)
+def curve_values(curve_name):
+    if curve_name == ss.df_for_plot.columns[0] and ss.get("log_depth_type", "MD") != "MD":
+        return ss.vertical_depths[ss.log_depth_type]
+    return ss.df_for_plot[curve_name].to_numpy()
+
+# Statistics of all curves of the log, computed once per log and shared with the dataset (for all sessions)
+def get_curve_stats():
+    return shared(ss.las_key + "/curve_stats", curve_stats, ss.df_for_plot)
+
+# Statistics of a curve to plot. The depth curve has the statistics of the selected depth type
+def curve_stats_row(curve_name):
+    if curve_name == ss.df_for_plot.columns[0] and ss.get("log_depth_type", "MD") != "MD":
+        return ss.vertical_depth_stats.loc[ss.log_depth_type]
+    return get_curve_stats().loc[str(curve_name)]
+
+# Slider bounds and default range of a curve. The depth curve shows its full range by default, the other curves their
+# P1 to P99 range
+def curve_slider_range(curve_name):
+    return slider_range(curve_stats_row(curve_name), robust=curve_name != ss.df_for_plot.columns[0])
+
+# Axis title of a curve, with the depth type for the depth curve
+def curve_title(curve_name):
+    if curve_name == ss.df_for_plot.columns[0] and ss.get("log_depth_type", "MD") != "MD":
+        return f"{curve_name} ({ss.log_depth_type})"
+    return curve_name
+
 # Get user input from sidebar
 def get_user_input():
     
     # Call back data from SS
     in_df = ss.df_for_plot
     
+    # TVD/TVDSS of the depth curve, if a deviation survey is loaded
+    get_vertical_depths()
+    
+    # Formation and DST labels of the samples, if the tops and DSTs are loaded
+    depth_labels = get_depth_labels()
+    label_columns = depth_labels.columns.tolist() if depth_labels is not None else []
+    
     # Setup X axis
     with st.sidebar.expander(":arrow_down: Setup the X Axis"):
         x_axis_val = st.selectbox('👉 Curve', options=in_df.columns, key = "x1")   # Get column name for the X axis
@@ -115,11 +289,14 @@ def get_user_input():
         y_scale_type = st.selectbox("👉 Scale type", options=["Linear", "Logarithmic"], key = "y2")
         y_invert = st.selectbox("👉 Inverted", options=["No", "Yes"], key = "y3")
         
-    # Setup the third axis (Color bar) 
-    color_by = st.sidebar.selectbox("👉 Color the data by", options=in_df.columns, key = "z") # Returned a string
-    color_curve_df = in_df[color_by]
-    color_max = color_curve_df.max() # Get max value of curve for input to color slider
-    color_min = color_curve_df.min() # Get min value of curve for input to color slider   
+    # Setup the third axis (Color bar). The formation and DST labels are also available as colour options
+    color_by = st.sidebar.selectbox("👉 Color the data by", options=in_df.columns.tolist() + label_columns, key = "z") # Returned a string
+    color_is_label = color_by in label_columns
+    if not color_is_label:
+        # Bounds and default range of the color slider, from the curve statistics (no scan of the data)
+        color_min, color_max, color_default = curve_slider_range(color_by)
+    else:
+        color_max = color_min = None
     
     # Store the user input into SS
     ss.x_axis_val = x_axis_val
@@ -130,49 +307,127 @@ def get_user_input():
     ss.y_invert = y_invert
     
     ss.color_by = color_by
+    ss.color_is_label = color_is_label
     ss.color_max = color_max
     ss.color_min = color_min
     
-    # Get max, min of curve values    
-    x_max = in_df[ss.x_axis_val].max()
-    x_min = in_df[ss.x_axis_val].min()
-    y_max = in_df[ss.y_axis_val].max()
-    y_min = in_df[ss.y_axis_val].min()
+    # Get the bounds (min, max) and the default range (P1 to P99, without the spikes) of the curves from their statistics
+    x_min, x_max, x_default = curve_slider_range(ss.x_axis_val)
+    y_min, y_max, y_default = curve_slider_range(ss.y_axis_val)
     
-    # Input ranges by sliders for curves of X, Y and Color
-    x_range = st.sidebar.slider(f"👉 {ss.x_axis_val} range", value = [x_min, x_max], key = "slider1")
-    y_range = st.sidebar.slider(f"👉 {ss.y_axis_val} range", value = [y_min, y_max], key = "slider2")
-    user_input_color = st.sidebar.slider(f"👉 {color_by} range", value = [color_min, color_max], key = "slider3")
+    # Input ranges by sliders for curves of X, Y and Color. Each curve keeps its own range
+    x_range = st.sidebar.slider(f"👉 {curve_title(ss.x_axis_val)} range", min_value = x_min, max_value = x_max, 
+                                value = x_default, key = f"slider1_{curve_title(ss.x_axis_val)}")
+    y_range = st.sidebar.slider(f"👉 {curve_title(ss.y_axis_val)} range", min_value = y_min, max_value = y_max, 
+                                value = y_default, key = f"slider2_{curve_title(ss.y_axis_val)}")
+    if not color_is_label:
+        user_input_color = st.sidebar.slider(f"👉 {curve_title(color_by)} range", min_value = color_min, max_value = color_max, 
+                                             value = color_default, key = f"slider3_{curve_title(color_by)}")
+    else:
+        user_input_color = None
        
     # Store the user input into SS
     ss.x_range = x_range
     ss.y_range = y_range
     ss.user_input_color = user_input_color
     
-# Using Streamlit Pandas Profiling for EDA of the Log curves
+# Fast exploration of the log curves: summaries, correlations, histograms and missing intervals. The analysis is cached
+# by the content of the log (in memory for all sessions, and on disk)
+def fast_eda():
+    
+    sampling = st.checkbox(f"👉 Sample the logs longer than {eda_max_rows} depth steps (faster)", value=True, key="tab1_eda_sampling")
+    max_rows = eda_max_rows if sampling else None
+    summary, correlation, missing, step = shared(f"{ss.las_key}/eda/{max_rows}", cached_eda, ss.las_key, ss.df_for_plot, max_rows)
+    if step > 1:
+        st.write(f"📣 :rainbow[Summaries and correlations of every {step}th depth step ({len(ss.df_for_plot) // step} of {len(ss.df_for_plot)})]")
+    
+    with st.expander("👉 Curve summaries :arrow_down:", expanded=True):
+        st.dataframe(summary, width=960, height=350,
+                     column_config={"histogram": st.column_config.BarChartColumn("Histogram (P1 to P99)")})
+    
+    # Correlation matrix as a heatmap
+    with st.expander("👉 Correlations :arrow_down:", expanded=True):
+        plot = px.imshow(correlation, zmin=-1, zmax=1, color_continuous_scale="RdBu_r", aspect="auto")
+        plot.update_layout(height = 600)
+        st.plotly_chart(plot, use_container_width=True)
+    
+    # Histogram of one curve, from the summary (no scan of the data)
+    with st.expander("👉 Histograms :arrow_down:"):
+        curve = st.selectbox("👉 Curve", options=summary.index.tolist(), key="tab1_eda_curve")
+        row = summary.loc[curve]
+        counts = np.asarray(row["histogram"])
+        centres = row["p1"] + (np.arange(len(counts)) + 0.5) * (row["p99"] - row["p1"]) / max(len(counts), 1)
+        plot = px.bar(x=centres, y=counts, labels={"x": curve, "y": "Samples"})
+        plot.update_traces(width=(row["p99"] - row["p1"]) / max(len(counts), 1) if row["p99"] > row["p1"] else None)
+        st.plotly_chart(plot, use_container_width=True)
+    
+    # Missing intervals, the longest first
+    with st.expander(f"👉 Missing intervals ({len(missing)}) :arrow_down:"):
+        st.dataframe(missing, width=960, height=350)
+
+# Build the full ydata report of a log in a worker of the job queue, step by step so the progress is shown and the
+# job can be cancelled between the steps. The report is written as an HTML file of the job
+def profile_report_job(job, df, title):
+    # job               : The job (see utils.job_queue)
+    # df                : The log data (a copy, the shared DataFrames are never modified)
+    # title             : Title of the report
+    job.progress(0.05, "Profiling the curves")
+    profile = ProfileReport(df, title=title, progress_bar=False)
+    profile.get_description()
+    job.progress(0.6, "Building the report")
+    profile.report
+    job.progress(0.8, "Rendering the HTML")
+    html = profile.to_html()
+    job.progress(0.95, "Writing the report")
+    with open(job.path(profile_report_file), "w", encoding="utf-8") as f:
+        f.write(html)
+
+# Full ydata report of the log curves (slow, opt-in). The report is built in the background: the page stays usable,
+# the progress is shown on each rerun, and the finished report (on disk) is shown by any session opening the same log
+def full_report():
+    
+    queue = get_job_queue()
+    job_id = job_id_of("profile_report", ss.las_key)
+    status = queue.status(job_id)
+    
+    # No report of this log yet (or the last one did not finish): a button to start it. The report is not auto-generating
+    if status is None or status["state"] in ["failed", "cancelled"]:
+        if status is not None:
+            st.write(f"📣 :rainbow[The last report was {status['state']}] {status['error']}")
+        if st.button("📣 Report generating is time consuming! 👉 Click to go! (it is built in the background)", key="tab1_report_start"):
+            queue.submit("profile_report", ss.las_key, profile_report_job, ss.df_for_plot.copy(), f"Well {ss.get('well_name', '')}",
+                         title=f"Profile report of {ss.get('well_name', '')}")
+            st.rerun()
+    
+    # The report is building: progress, a button to check again, and a button to cancel
+    elif status["state"] in ["queued", "running"]:
+        st.progress(status["progress"], text=f"⏳ {status['message']} ... you can keep working on the other tabs and pages")
+        col1, col2 = st.columns(2)
+        col1.button("🔄 Check the progress", key="tab1_report_refresh")
+        if col2.button("✋ Cancel", key="tab1_report_cancel"):
+            queue.cancel(job_id)
+            st.rerun()
+    
+    # The report is ready: show it from the disk, with a download button
+    else:
+        with open(os.path.join(queue.folder(job_id), profile_report_file), encoding="utf-8") as f:
+            html = f.read()
+        col1, col2 = st.columns(2)
+        col1.download_button("💾 Download the report", data=html, file_name=f"{ss.get('well_name', 'log')}_profile_report.html",
+                             mime="text/html", key="tab1_report_download")
+        if col2.button("🗑️ Discard the report", key="tab1_report_discard"):
+            queue.remove(job_id)
+            st.rerun()
+        components.html(html, height=1000, scrolling=True)
+
+# EDA of the Log curves: the fast cached analysis, or the full ydata report on demand
 def tab1_func():
     
-    # Create a place holder for a button and a message
-    temp_place_holder = st.empty()
-      
-    if "profile" not in ss:
-        
-        # Create a button to control the running flow. The report is not auto-generating         
-        generate_button = temp_place_holder.button("📣 Report generating is time consuming! 👉 Click to go!")
-        
-        # If user click the button 
-        if generate_button:   
-            # temp_place_holder.write("The report is generating, Please wait!")
-            profile = ProfileReport(ss.df_for_plot)
-            st_profile_report(profile)
-            
-            # Store the report into SS
-            ss.profile = profile
-            temp_place_holder.empty()
-            
+    eda_mode = st.radio("👉 Analysis", options=["Fast (cached)", "Full report (ydata, slow)"], horizontal=True, key="tab1_eda_mode")
+    if eda_mode == "Fast (cached)":
+        fast_eda()
     else:
-        # Get out the report from session state
-        st_profile_report(ss.profile)
+        full_report()
 
 # This function is simply put the header sections in to the streamlit expanders
 def tab2_func():
@@ -182,6 +437,13 @@ def tab2_func():
 
     with st.expander("👉 Curve information :arrow_down:"):
         st.dataframe(ss.curves_header_df, width=960, height=350)
+    
+    with st.expander("👉 Curve statistics :arrow_down:"):
+        st.dataframe(get_curve_stats(), width=960, height=350,
+                     column_config={"histogram": st.column_config.BarChartColumn("Histogram (P1 to P99)")})
+    
+    with st.expander("👉 Memory of the curves (NULL values as NaN, float32 where the precision allows) :arrow_down:"):
+        st.dataframe(memory_report(ss.df_for_plot), width=960, height=350)
  
     with st.expander("👉 Parameter information	:arrow_down:"):
         st.dataframe(ss.parameter_header_df, width=960, height=350)
@@ -189,10 +451,30 @@ def tab2_func():
     with st.expander("👉 Other information	:arrow_down:"):
         st.dataframe(ss.other_header_df, width=960, height=350)
 
+# Range of a plot axis for a slider window
+def axis_view(value_range, log, reversed_axis):
+    lo, hi = min(value_range), max(value_range)
+    if log:
+        lo, hi = np.log10(max(lo, np.finfo(float).tiny)), np.log10(max(hi, np.finfo(float).tiny))
+    return [hi, lo] if reversed_axis else [lo, hi]
+
+# Density image of the window, kept into SS so it is only binned again when the window or the curves change
+def get_density_image(x_values, y_values, rows, log_x, log_y):
+    image_key = (ss.las_key, ss.x_axis_val, ss.y_axis_val, ss.color_by, ss.get("log_depth_type", "MD"),
+                 ss.get("vertical_depths_key"), ss.get("depth_labels_key"), tuple(ss.x_range), tuple(ss.y_range),
+                 log_x, log_y)
+    if ss.get("density_image_key") != image_key:
+        if ss.color_is_label:
+            label_codes = ss.depth_labels[ss.color_by].cat.codes.to_numpy()[rows]
+            ss.density_image = density_image(x_values[rows], y_values[rows], ss.x_range, ss.y_range, log_x, log_y,
+                                             label_codes=label_codes)
+        else:
+            ss.density_image = density_image(x_values[rows], y_values[rows], ss.x_range, ss.y_range, log_x, log_y,
+                                             color=np.asarray(curve_values(ss.color_by), dtype=float)[rows])
+        ss.density_image_key = image_key
+    return ss.density_image
+
 def tab3_func():
-    
-    # Call back data from SS
-    in_df = ss.df_for_plot
    
     # Define a color palette
     color_template = ["orange", "red","green", "blue", "purple"]
@@ -218,39 +500,85 @@ def tab3_func():
     else:
         log_y = False    
                 
-    # Plot        
-    plot = px.scatter(in_df, x=ss.x_axis_val, y=ss.y_axis_val, color=ss.color_by, 
-                      color_continuous_scale=color_template,
-                      log_x=log_x, log_y=log_y, range_color=[ss.color_min, ss.color_max])
+    # Only the samples inside the visible window (the X and Y ranges) are plotted.
+    # The curves are given as arrays, so the depth curve can be shown in MD, TVD or TVDSS
+    x_values, y_values = curve_values(ss.x_axis_val), curve_values(ss.y_axis_val)
+    rows = window_rows(x_values, y_values, ss.x_range, ss.y_range, log_x, log_y)
+    axis_titles = {"x": curve_title(ss.x_axis_val), "y": curve_title(ss.y_axis_val), "color": curve_title(ss.color_by)}
     
-    # Slyling and Updating the plots
+    if len(rows) <= webgl_max_points:
+        # A few points as SVG, more as WebGL. A formation/DST label is a discrete colour, a curve a continuous colour scale
+        render_mode = "svg" if len(rows) <= svg_max_points else "webgl"
+        st.write(f"📣 :rainbow[{len(rows)} samples in the window, drawn as points ({render_mode.upper()})]")
+        if ss.color_is_label:
+            plot = px.scatter(x=x_values[rows], y=y_values[rows], 
+                              color=ss.depth_labels[ss.color_by].astype(str).to_numpy()[rows],
+                              labels=axis_titles, log_x=log_x, log_y=log_y, render_mode=render_mode)
+        else:
+            plot = px.scatter(x=x_values[rows], y=y_values[rows], color=curve_values(ss.color_by)[rows], 
+                              color_continuous_scale=color_template, labels=axis_titles,
+                              log_x=log_x, log_y=log_y, range_color=[ss.color_min, ss.color_max], render_mode=render_mode)
+            plot.update_layout(coloraxis = dict(cmin=ss.user_input_color[0], cmax=ss.user_input_color[1]))
+    else:
+        # Too many points: a density image binned on the server, the size does not grow with the number of samples
+        st.write(f"📣 :rainbow[{len(rows)} samples in the window, drawn as a density image (mean {ss.color_by} per cell)]")
+        image = get_density_image(x_values, y_values, rows, log_x, log_y)
+        if ss.color_is_label:
+            # The most common label of each cell, one WebGL square per cell
+            categories = ss.depth_labels[ss.color_by].cat.categories
+            cell_rows, cell_columns = np.nonzero(image["counts"])
+            codes = image["label_code"][cell_rows, cell_columns]
+            plot = px.scatter(x=image["x_centres"][cell_columns], y=image["y_centres"][cell_rows],
+                              color=np.where(codes >= 0, np.asarray(categories, dtype=object)[np.maximum(codes, 0)], "nan"),
+                              labels=axis_titles, log_x=log_x, log_y=log_y, render_mode="webgl")
+            plot.update_traces(marker=dict(symbol="square", size=4))
+        else:
+            plot = go.Figure(go.Heatmap(x=image["x_centres"], y=image["y_centres"], z=image["color_mean"],
+                                        text=image["counts"], colorscale=color_template,
+                                        zmin=ss.user_input_color[0], zmax=ss.user_input_color[1],
+                                        colorbar=dict(title=axis_titles["color"]),
+                                        hovertemplate="x: %{x}<br>y: %{y}<br>mean: %{z}<br>samples: %{text}<extra></extra>"))
+            plot.update_xaxes(type="log" if log_x else "linear", title=axis_titles["x"])
+            plot.update_yaxes(type="log" if log_y else "linear", title=axis_titles["y"])
+    
+    # Slyling and Updating the plots. The view is the window of the sliders (log10 values on a log axis)
     plot.update_xaxes(showline=True, showgrid= True, linewidth=1, linecolor='white', mirror=True)
     plot.update_yaxes(showline=True, linewidth=1, linecolor='white', mirror=True)
-    plot.update_xaxes(range = ss.x_range, autorange = autorangeX)
-    plot.update_yaxes(range = ss.y_range, autorange = autorangeY)
-    plot.update_layout(coloraxis = dict(cmin=ss.user_input_color[0], cmax=ss.user_input_color[1]))
+    plot.update_xaxes(range = axis_view(ss.x_range, log_x, autorangeX == "reversed"), autorange = False)
+    plot.update_yaxes(range = axis_view(ss.y_range, log_y, autorangeY == "reversed"), autorange = False)
     plot.update_layout(height = 700)
     st.plotly_chart(plot, use_container_width=True)    
                      
 def main_entry(): 
     
-    text_message = ''':rainbow[👉 Please select and load a LAS data file (Version 2.0 or older) to begin]:hibiscus:'''
+    text_message = ''':rainbow[👉 Please select and load a LAS data file (Version 2.0 or older) to begin - 
+    or many LAS files (or zip files of them) to add to the log store]:hibiscus:'''
     
     # Load the data files at the first time running ONLY
     try:
         # Check if the data is loaded
         if "df_for_plot" not in ss:
             # Create a file uploader widget
-            uploaded_file = st.sidebar.file_uploader("👉 Please select a LAS file", type=["las", "LAS"], accept_multiple_files=False)           
-            # Call load_data function 
-            well_data_df, well_header_df, well_name, curves_header_df, parameter_header_df, other_header_df = load_data(uploaded_file)
-            # Store data into SS
-            ss.df_for_plot = well_data_df
-            ss.well_header_df = well_header_df
-            ss.well_name = well_name
-            ss.curves_header_df = curves_header_df
-            ss.parameter_header_df = parameter_header_df
-            ss.other_header_df = other_header_df
+            uploaded_files = st.sidebar.file_uploader("👉 Please select a LAS file (or many, or zip files)", 
+                                                      type=["las", "LAS", "zip"], accept_multiple_files=True)           
+            # Many files or zips go to the log store, a well is then opened from the store
+            if len(uploaded_files) > 1 or (uploaded_files and uploaded_files[0].name.lower().endswith(".zip")):
+                ingest_uploads(uploaded_files)
+            else:
+                uploaded_file = uploaded_files[0] if uploaded_files else None
+                # Key of the upload content (hashed once), for the loader and the labels of the samples
+                las_key = content_hash("las", uploaded_file) if uploaded_file else None
+                # Call load_data function 
+                well_data_df, well_header_df, well_name, curves_header_df, parameter_header_df, other_header_df = \
+                    load_data(uploaded_file, dataset_key=las_key)
+                # Store data into SS
+                ss.df_for_plot = well_data_df
+                ss.well_header_df = well_header_df
+                ss.well_name = well_name
+                ss.curves_header_df = curves_header_df
+                ss.parameter_header_df = parameter_header_df
+                ss.other_header_df = other_header_df
+                ss.las_key = las_key
             
     except Exception as e:
         # Ignore the error of the first run, when user has not select the files to upload
@@ -259,6 +587,19 @@ def main_entry():
         # Populate a message of loading data problem
         # st.write(e)
         
+    # Ingestion of the uploads into the log store (running in the background)
+    if "ingest_job_id" in ss:
+        try:
+            show_ingest_job()
+        except Exception as e:
+            st.sidebar.write(e)
+        
+    # Open a LAS file of the log store
+    try:
+        open_store_log()
+    except Exception as e:
+        st.sidebar.write(e)
+        
     # User input from the sidebar
     try:
         get_user_input()
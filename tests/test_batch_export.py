@@ -0,0 +1,8 @@
+from batch_export import output_names
+
+
+def test_output_names_are_unique():
+    names = output_names(["W 1/x", "W_1_x", "w_1_x", "A-2"])
+    assert names["W 1/x"] == "W_1_x"
+    assert names["A-2"] == "A-2"
+    assert len({name.lower() for name in names.values()}) == 4
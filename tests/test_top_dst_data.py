@@ -0,0 +1,10 @@
+import io
+import pytest
+from utils.top_dst_data import read_top_dst
+
+
+def test_read_top_dst_corrupt_workbook():
+    uploaded_file = io.BytesIO(b"not a zip file")
+    uploaded_file.name = "tops.xlsx"
+    with pytest.raises(ValueError, match="tops.xlsx is not a valid Excel workbook"):
+        read_top_dst([uploaded_file])
@@ -0,0 +1,29 @@
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+from utils.well_plots import declutter_labels, well_top
+
+
+def test_declutter_labels_keeps_single_labels_at_their_depth():
+    fig, ax = plt.subplots()
+    depths, texts = declutter_labels(ax, np.array([1003.0, 1500.0, 1501.0, 1502.0]), np.array(list("abcd")), 1000, 3000)
+    plt.close(fig)
+    assert depths[0] == 1003.0
+    assert texts == ["a", "b / c / d"]
+
+
+def test_declutter_labels_collapsed_range():
+    fig, ax = plt.subplots()
+    depths, texts = declutter_labels(ax, np.array([1500.0, 1500.0]), np.array(["a", "b"]), 1500, 1500)
+    plt.close(fig)
+    assert list(depths) == [1500.0, 1500.0]
+    assert texts == ["a", "b"]
+
+
+def test_well_top_collapsed_range():
+    df = pd.DataFrame({"well_name": ["W1", "W1"], "surface_name": ["A", "B"], "surface_tvd_m": [np.nan, np.nan],
+                       "surface_md_m": [1500.0, 1600.0], "surface_twt_ms": [np.nan, np.nan]})
+    fig = well_top(df, 1500.0, 1500.0, 1, 3)
+    plt.close(fig)
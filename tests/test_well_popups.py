@@ -0,0 +1,14 @@
+import numpy as np
+import pandas as pd
+from utils.well_popups import build_well_popups
+
+
+def test_build_well_popups_missing_field():
+    wells = pd.DataFrame({"WELL_NAME": ["W1", "W2", "W1"], "TD_M": [3000.0, np.nan, 1.0],
+                          "STATUS": pd.Categorical(["P&A", None, "x"]), "RESULT": ["Oil", "Dry", "x"],
+                          "NOTES": [None, "<b>", "x"], "COMPLETED": ["2001", "2002", "x"]})
+    popups = build_well_popups(wells)
+    assert list(popups.index) == ["W1", "W2"]
+    assert popups.notna().all()
+    assert "<td>3000.0</td><td>P&amp;A</td><td>Oil</td><td></td><td>2001</td>" in popups["W1"]
+    assert "<td></td><td></td><td>Dry</td><td>&lt;b&gt;</td>" in popups["W2"]
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Cross plot engine of the Well Logs page. Only the samples inside the visible window (the X and Y ranges) are sent
+# to the browser: as an SVG scatter for a few points, as a WebGL scatter for more, and above that as a density image
+# binned on the server (a fixed number of cells, whatever the number of samples)
+
+# Number of visible points above which the scatter is drawn with WebGL, and above which it becomes a density image
+svg_max_points = 10000
+webgl_max_points = 100000
+# Number of cells of the density image along each axis
+density_bins = 300
+
+# Rows of the samples inside the visible window. Samples without a value (or not positive on a log axis) are left out
+def window_rows(x, y, x_range, y_range, log_x=False, log_y=False):
+    # x, y              : numpy arrays of the curve values
+    # x_range, y_range  : [min, max] of the visible window
+    keep = (x >= min(x_range)) & (x <= max(x_range)) & (y >= min(y_range)) & (y <= max(y_range))
+    if log_x:
+        keep = keep & (x > 0)
+    if log_y:
+        keep = keep & (y > 0)
+    return np.flatnonzero(keep)
+
+# Cell edges of one axis over the visible window, in log10 space for a log axis. Return the edges (lo, hi) and the
+# centres of the cells (in curve values)
+def axis_cells(value_range, log, bins):
+    lo, hi = min(value_range), max(value_range)
+    if log:
+        lo, hi = np.log10(max(lo, np.finfo(float).tiny)), np.log10(hi)
+    if hi <= lo:
+        hi = lo + 1.0
+    centres = lo + (np.arange(bins) + 0.5) * (hi - lo) / bins
+    return (lo, hi), (10 ** centres if log else centres)
+
+# Flat cell number (row * bins + column) of each sample of the window
+def cell_of(x, y, x_edges, y_edges, log_x, log_y, bins):
+    tx = np.log10(x) if log_x else x
+    ty = np.log10(y) if log_y else y
+    column = np.clip(((tx - x_edges[0]) / (x_edges[1] - x_edges[0]) * bins).astype(np.int64), 0, bins - 1)
+    row = np.clip(((ty - y_edges[0]) / (y_edges[1] - y_edges[0]) * bins).astype(np.int64), 0, bins - 1)
+    return row * bins + column
+
+# Density image of the samples of the window: the number of samples per cell, and the mean of a colour curve per
+# cell (or the most common label per cell for a label colour). All cells are counted in one bincount pass
+def density_image(x, y, x_range, y_range, log_x=False, log_y=False, color=None, label_codes=None, bins=density_bins):
+    # x, y              : numpy arrays of the curve values inside the window (see window_rows)
+    # color             : Optional numpy array of a colour curve (same samples), averaged per cell
+    # label_codes       : Optional numpy array of label codes (same samples, -1 for no label), the most common per cell
+    # Return a dict of the cell centres (x_centres, y_centres), counts (bins x bins, rows are y), and color_mean or
+    # label_code (bins x bins, NaN / -1 for the empty cells)
+    x_edges, x_centres = axis_cells(x_range, log_x, bins)
+    y_edges, y_centres = axis_cells(y_range, log_y, bins)
+    cell = cell_of(x, y, x_edges, y_edges, log_x, log_y, bins)
+    counts = np.bincount(cell, minlength=bins * bins)
+    image = {"x_centres": x_centres, "y_centres": y_centres, "counts": counts.reshape(bins, bins)}
+
+    if color is not None:
+        valid = ~np.isnan(color)
+        sums = np.bincount(cell[valid], weights=color[valid], minlength=bins * bins)
+        valid_counts = np.bincount(cell[valid], minlength=bins * bins)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            image["color_mean"] = np.where(valid_counts > 0, sums / valid_counts, np.nan).reshape(bins, bins)
+
+    if label_codes is not None:
+        # Count the samples per (cell, label) and keep the label with the most samples in each cell
+        number_of_labels = int(label_codes.max()) + 2 if len(label_codes) else 1
+        label_counts = np.bincount(cell * number_of_labels + (label_codes + 1),
+                                   minlength=bins * bins * number_of_labels).reshape(bins * bins, number_of_labels)
+        image["label_code"] = np.where(counts > 0, label_counts.argmax(axis=1) - 1, -1).reshape(bins, bins)
+    return image
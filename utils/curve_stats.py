@@ -0,0 +1,53 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+# Statistics of the curves of a log, computed once per loaded log in one pass over all curves (no loop over the
+# curves) and shared with the dataset. The sliders, the cross plot and the well information tab read the ranges from
+# here instead of scanning the data again on every rerun
+
+# Number of bins of the curve histograms
+histogram_bins = 40
+
+# Statistics of all curves of a log
+def curve_stats(df, bins=histogram_bins):
+    # df                : The log data (one column per curve). Text curves are read as numbers where possible
+    # bins              : Number of bins of the histograms, between the P1 and the P99 of each curve
+    # Return a DataFrame indexed by curve: points (values), nulls (missing values), null_pct, min, max, mean, p1, p99
+    # (robust range, without the spikes) and histogram (list of the counts of the bins, the values below P1 and above
+    # P99 are counted in the first and the last bins)
+    numeric = df.apply(pd.to_numeric, errors="coerce") if any(not pd.api.types.is_numeric_dtype(t) for t in df.dtypes) else df
+    values = numeric.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    points = valid.sum(axis=0)
+
+    # All-null curves give NaN statistics (and numpy warnings, not needed here)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mins, maxs = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        means = np.nanmean(values, axis=0)
+        p1, p99 = np.nanpercentile(values, [1, 99], axis=0)
+
+    # Histograms of all curves in one bincount: the bin of each value, shifted by the curve number
+    span = np.where(p99 > p1, p99 - p1, 1.0)
+    bin_of_value = np.clip(((values - np.nan_to_num(p1)) / span * bins), 0, bins - 1)
+    bin_of_value = np.where(valid, bin_of_value, 0).astype(np.int64) + np.arange(values.shape[1]) * bins
+    histograms = np.bincount(bin_of_value[valid], minlength=values.shape[1] * bins).reshape(values.shape[1], bins)
+
+    return pd.DataFrame({"points": points, "nulls": len(values) - points,
+                         "null_pct": np.round(100 * (len(values) - points) / max(len(values), 1), 2),
+                         "min": mins, "max": maxs, "mean": means, "p1": p1, "p99": p99,
+                         "histogram": [counts.tolist() for counts in histograms]},
+                        index=pd.Index([str(col) for col in df.columns], name="curve"))
+
+# Slider bounds and default range of a curve from its statistics: the bounds are the min and max, the default range
+# the P1 to P99 range (so the spikes are not in the default view), or the full range if not robust
+def slider_range(stats_row, robust=True):
+    lo, hi = float(stats_row["min"]), float(stats_row["max"])
+    if np.isnan(lo) or np.isnan(hi):
+        return 0.0, 1.0, [0.0, 1.0]
+    if hi <= lo:
+        return lo, lo + 1.0, [lo, lo + 1.0]
+    if not robust or float(stats_row["p99"]) <= float(stats_row["p1"]):
+        return lo, hi, [lo, hi]
+    return lo, hi, [float(stats_row["p1"]), float(stats_row["p99"])]
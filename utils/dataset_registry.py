@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import weakref
+import functools
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.disk_cache import content_hash
+
+# Process-wide registry of the loaded datasets, shared read-only by all sessions.
+# Sessions opening the same upload get a reference to the same objects, not a copy. Each session holds a lease
+# (kept in its Session State) on the datasets it uses; the lease is released when the session is garbage collected.
+# Datasets that no session is using are evicted, least recently used first, when the registry is over its budget.
+# Note: the shared DataFrames must never be modified in place by the pages.
+
+# Memory budget of the registry, can be changed by an environment variable
+REGISTRY_MAX_BYTES = int(float(os.environ.get("GG_REGISTRY_MAX_MB", "4096")) * 1024 * 1024)
+
+# Session State key of the leases of a session
+LEASES_KEY = "_dataset_leases"
+
+# Rough memory size of a dataset (DataFrames, arrays, containers of them)
+def estimate_nbytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+# A session's hold on a dataset. The dataset is released when the lease is garbage collected
+class Lease:
+    def __init__(self, registry, key, value):
+        self.key = key
+        self.value = value
+        weakref.finalize(self, registry.release, key)
+
+class DatasetRegistry:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = {}   # key -> {"value", "nbytes", "refs", "last_used"}
+        self.total_bytes = 0
+
+    # Lease an existing dataset. Return None if the key is not in the registry
+    def acquire(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry["refs"] = entry["refs"] + 1
+            entry["last_used"] = time.monotonic()
+            value = entry["value"]
+        return Lease(self, key, value)
+
+    # Add a dataset and lease it. If the key was added meanwhile (by another session), the existing one is used
+    def put(self, key, value):
+        nbytes = estimate_nbytes(value)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = {"value": value, "nbytes": nbytes, "refs": 0, "last_used": time.monotonic()}
+                self.total_bytes = self.total_bytes + nbytes
+            entry = self.entries[key]
+            entry["refs"] = entry["refs"] + 1
+            entry["last_used"] = time.monotonic()
+            value = entry["value"]
+            self.evict()
+        return Lease(self, key, value)
+
+    def release(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["refs"] = max(entry["refs"] - 1, 0)
+                self.evict()
+
+    # Remove the unused datasets, least recently used first, until the registry is within its budget.
+    # Must be called with the lock held
+    def evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        unused = sorted((entry["last_used"], key) for key, entry in self.entries.items() if entry["refs"] == 0)
+        for _, key in unused:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.total_bytes = self.total_bytes - self.entries.pop(key)["nbytes"]
+
+    # Summary of the registry, for monitoring
+    def stats(self):
+        with self.lock:
+            return {"datasets": len(self.entries), "total_bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                    "in_use": sum(1 for entry in self.entries.values() if entry["refs"] > 0)}
+
+# One registry for the whole server process (st.cache_resource keeps it across reruns and sessions)
+@st.cache_resource
+def get_registry():
+    return DatasetRegistry(REGISTRY_MAX_BYTES)
+
+# Get a shared dataset by key, or build it (builder(*args)) and share it. The current session takes a lease on it
+def shared(key, builder, *args):
+    registry = get_registry()
+    lease = registry.acquire(key)
+    if lease is None:
+        lease = registry.put(key, builder(*args))
+    st.session_state.setdefault(LEASES_KEY, {})[key] = lease
+    return lease.value
+
+# Release the leases of the current session on a dataset and on the datasets derived from it (keys starting with
+# "<key>/"), e.g. when the session moves on to another dataset. The registry can then evict them
+def release_shared(key):
+    leases = st.session_state.get(LEASES_KEY, {})
+    for lease_key in [lease_key for lease_key in leases if lease_key == key or lease_key.startswith(key + "/")]:
+        del leases[lease_key]
+
+# Decorator for a loader taking the uploaded file(s) as the first argument. The result is shared across sessions
+# by the content of the upload. Use it instead of @st.cache_data, which hands out a new copy on every call.
+# The caller can pass the content hash of the upload as dataset_key, so a large upload is only hashed once (the key
+# is passed down to @disk_cache)
+def shared_dataset(loader_name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(uploaded_files, *args, dataset_key=None, **kwargs):
+            # Nothing uploaded yet, nothing to share
+            if not uploaded_files:
+                return func(uploaded_files, *args, **kwargs)
+            key = dataset_key or content_hash(loader_name, uploaded_files)
+            if getattr(func, "takes_dataset_key", False):
+                kwargs["dataset_key"] = key
+            return shared(key, lambda: func(uploaded_files, *args, **kwargs))
+        return wrapper
+    return decorator
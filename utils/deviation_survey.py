@@ -0,0 +1,153 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from utils.top_dst_data import read_xlsx_sheets, validate_table, partition_by_well
+
+# Deviation surveys and the conversion of measured depths (md) to true vertical depths (TVD, TVDSS), shared by the
+# DSTs and Tops page and the Well Logs page. The well path is computed once per well by the minimum curvature method,
+# then any number of depths (tops, DST intervals, log samples) are converted at once with numpy, no loop over the rows
+
+# Expected columns of the survey table. md is measured from the depth datum (KB/RT) of the well, datum_elevation_m is
+# the height of that datum above the sea level (needed for TVDSS only)
+survey_schema = {"well_name": "string", "md_m": "float64", "inclination_deg": "float64", "azimuth_deg": "float64",
+                 "datum_elevation_m": "float64"}
+survey_required = ["md_m", "inclination_deg", "azimuth_deg"]
+
+# The vertical depth types, besides the measured depth
+vertical_modes = ["TVD", "TVDSS"]
+
+# Read the deviation surveys from the uploaded file(s), check and sort them
+def read_surveys(uploaded_files):
+    # uploaded_files    : Excel workbook(s) with a sheet "deviation_survey", or CSV/Parquet files. A CSV/Parquet file
+    #                     without a well_name column is the survey of one well, named after the file
+    if uploaded_files:
+
+        tables = []
+        for uploaded_file in uploaded_files:
+            file_name = uploaded_file.name.lower()
+            if file_name.endswith((".xlsx", ".xlsm")):
+                table = read_xlsx_sheets(uploaded_file, ("deviation_survey",))["deviation_survey"]
+            elif file_name.endswith(".xls"):
+                table = pd.read_excel(uploaded_file, sheet_name="deviation_survey")
+            elif file_name.endswith(".parquet"):
+                table = pd.read_parquet(io.BytesIO(uploaded_file.getvalue()))
+            else:
+                table = pd.read_csv(io.BytesIO(uploaded_file.getvalue()))
+            if "well_name" not in table.columns:
+                table["well_name"] = os.path.splitext(uploaded_file.name)[0]
+            tables.append(validate_table(table, "deviation_survey", survey_schema, survey_required))
+        df_survey = pd.concat(tables, ignore_index=True)
+
+        # Drop the stations without values, and the repeated stations of a well
+        df_survey = df_survey.dropna(subset=["well_name", "md_m", "inclination_deg", "azimuth_deg"])
+        df_survey = df_survey.sort_values(["well_name", "md_m"]).drop_duplicates(["well_name", "md_m"])
+        bad = (df_survey["inclination_deg"] < 0) | (df_survey["inclination_deg"] > 180) | (df_survey["md_m"] < 0)
+        if bad.any():
+            raise ValueError(f'The "deviation_survey" data has {int(bad.sum())} stations with a negative md or an '
+                             f'inclination out of 0-180 degrees (first one in well {df_survey.loc[bad, "well_name"].iloc[0]})')
+        return df_survey.reset_index(drop=True)
+
+# Well path (TVD) at the survey stations by the minimum curvature method, all the stations of a well at once
+def minimum_curvature(md, inclination, azimuth):
+    # md                : numpy array of the station depths (md), strictly increasing, the first one at 0
+    # inclination       : numpy array of the inclinations (degrees)
+    # azimuth           : numpy array of the azimuths (degrees)
+    # Return the TVD of the stations and the dogleg angle (radians) of each interval between two stations
+    inc, azi = np.radians(inclination), np.radians(azimuth)
+    i1, i2 = inc[:-1], inc[1:]
+    cos_dogleg = np.cos(i2 - i1) - np.sin(i1) * np.sin(i2) * (1 - np.cos(azi[1:] - azi[:-1]))
+    dogleg = np.arccos(np.clip(cos_dogleg, -1.0, 1.0))
+    # Ratio factor of the arc, 1 for a straight interval
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(dogleg > 1e-9, 2 / dogleg * np.tan(dogleg / 2), 1.0)
+    tvd_step = np.diff(md) / 2 * (np.cos(i1) + np.cos(i2)) * ratio
+    return np.concatenate([[0.0], np.cumsum(tvd_step)]), dogleg
+
+# Split the survey table by well and compute the well path of each well once, at load time
+def build_surveys(df_survey):
+    # df_survey         : The survey table from read_surveys
+    # Return a dict of well name -> dict of the station arrays md, inclination, tvd, dogleg and the datum elevation
+    all_md = df_survey["md_m"].to_numpy(dtype=float)
+    all_inclination = df_survey["inclination_deg"].to_numpy(dtype=float)
+    all_azimuth = df_survey["azimuth_deg"].to_numpy(dtype=float)
+    all_datum = df_survey["datum_elevation_m"].to_numpy(dtype=float)
+    surveys = {}
+    for well_name, rows in df_survey.groupby("well_name", sort=False).indices.items():
+        md, inclination, azimuth = all_md[rows], all_inclination[rows], all_azimuth[rows]
+        # The well is vertical from the datum down to the first station
+        if md[0] > 0:
+            md, inclination, azimuth = np.append(0.0, md), np.append(0.0, inclination), np.append(azimuth[0], azimuth)
+        tvd, dogleg = minimum_curvature(md, inclination, azimuth)
+        datum = all_datum[rows]
+        surveys[well_name] = {"md": md, "inclination": inclination, "tvd": tvd, "dogleg": dogleg,
+                              "datum": datum[~np.isnan(datum)][0] if (~np.isnan(datum)).any() else np.nan}
+    return surveys
+
+# Convert measured depths to TVD (or TVDSS) along the well path. The depths between two stations are put on the arc
+# of the minimum curvature (not a straight line between the stations), below the last station the well goes straight
+def md_to_vertical(survey, md, mode="TVD"):
+    # survey            : The survey of the well, from build_surveys
+    # md                : numpy array of the measured depths (meters), any order, NaN allowed
+    # mode              : "TVD" (below the datum) or "TVDSS" (below the sea level)
+    md = np.asarray(md, dtype=float)
+    stations_md, stations_tvd = survey["md"], survey["tvd"]
+    cos_inc = np.cos(np.radians(survey["inclination"]))
+
+    # Interval of each depth (the last station is the start of the straight section below it)
+    row = np.clip(np.searchsorted(stations_md, md, side="right") - 1, 0, len(stations_md) - 1)
+    inner = row < len(stations_md) - 1
+    interval = np.minimum(row, len(stations_md) - 2)
+    length = np.where(inner, stations_md[interval + 1] - stations_md[interval], 1.0) if len(stations_md) > 1 else np.ones(len(md))
+    fraction = (md - stations_md[row]) / length
+
+    # Along the arc: TVD(f) = TVD1 + L / (b sin b) * ((cos((1 - f) b) - cos b) cos i1 + (1 - cos(f b)) cos i2), b the dogleg.
+    # A (nearly) straight interval has the limit L * ((f - f^2 / 2) cos i1 + f^2 / 2 cos i2)
+    tvd = stations_tvd[row] + (md - stations_md[row]) * cos_inc[row]
+    if len(stations_md) > 1:
+        dogleg = survey["dogleg"][interval]
+        f, i1, i2 = fraction, cos_inc[interval], cos_inc[interval + 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            arc = length / (dogleg * np.sin(dogleg)) * ((np.cos((1 - f) * dogleg) - np.cos(dogleg)) * i1
+                                                        + (1 - np.cos(f * dogleg)) * i2)
+        straight = length * ((f - f * f / 2) * i1 + f * f / 2 * i2)
+        on_arc = np.where(dogleg > 1e-6, arc, straight)
+        tvd = np.where(inner, stations_tvd[row] + on_arc, tvd)
+    # Above the datum the depth is not changed
+    tvd = np.where(md < 0, md, tvd)
+
+    if mode == "TVDSS":
+        tvd = tvd - survey["datum"]
+    return tvd
+
+# Add the vertical depth columns to a table of several wells (tops or DSTs). Each well is converted in one call,
+# the wells without a survey get blank depths
+def add_vertical_depths(df, surveys, md_cols, mode="TVD"):
+    # df                : The table (well_top or well_dst), with a well_name column
+    # surveys           : The surveys of the wells, from build_surveys
+    # md_cols           : Names of the measured depth columns to convert
+    # mode              : "TVD" or "TVDSS"
+    # Return a copy of the table with one more column per md column (e.g. surface_md_m -> surface_md_tvd_m), and the
+    # list of the new column names
+    vertical_cols = [f"{col[:-2] if col.endswith('_m') else col}_{mode.lower()}_m" for col in md_cols]
+    vertical = {col: np.full(len(df), np.nan) for col in vertical_cols}
+    for well_name, rows in df.groupby("well_name", sort=False).indices.items():
+        if well_name in surveys:
+            for md_col, vertical_col in zip(md_cols, vertical_cols):
+                vertical[vertical_col][rows] = md_to_vertical(surveys[well_name], df[md_col].to_numpy(dtype=float)[rows], mode)
+    return df.assign(**vertical), vertical_cols
+
+# The tops and DSTs of all wells in one depth type, converted once and partitioned by well like the measured depths,
+# so switching the display between MD, TVD and TVDSS only picks another view
+def vertical_depth_view(df_well_top, df_well_dst, surveys, mode):
+    # df_well_top       : The well_top table
+    # df_well_dst       : The well_dst table
+    # surveys           : The surveys of the wells, from build_surveys
+    # mode              : "TVD" or "TVDSS"
+    # Return a dict of the converted tables, their partitions and the names of the depth columns
+    # (tops, DST tops, DST bases)
+    df_top, top_cols = add_vertical_depths(df_well_top, surveys, ["surface_md_m"], mode)
+    df_dst, dst_cols = add_vertical_depths(df_well_dst, surveys, ["dst_depth_top_m", "dst_depth_base_m"], mode)
+    return {"df_top": df_top, "df_dst": df_dst, "depth_cols": (top_cols[0], dst_cols[0], dst_cols[1]),
+            "top_partitions": partition_by_well(df_top, top_cols[0]),
+            "dst_partitions": partition_by_well(df_dst, dst_cols[0], dst_cols[1])}
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import functools
+import pandas as pd
+import geopandas as gpd
+
+# On-disk cache of the parsed upload results, shared by all sessions and kept across server restarts.
+# An entry is keyed by a content hash of the uploaded bytes (and the loader name), and stored as a folder of
+# Parquet/GeoParquet files (one per DataFrame in the result) plus a small JSON manifest for the other values.
+# The least recently used entries are evicted when the cache grows over its size limit.
+
+# Cache folder and size limit, can be changed by environment variables
+CACHE_DIR = os.environ.get("GG_CACHE_DIR", os.path.join(".cache", "datasets"))
+CACHE_MAX_BYTES = int(float(os.environ.get("GG_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+MANIFEST = "manifest.json"
+
+# Format version of each loader (set by @disk_cache), part of the content hash. A loader returning something different
+# for the same upload (new columns, types, parsing) bumps its version, so the entries of the older versions are not used
+loader_versions = {}
+
+# Hash the uploaded file(s). Names are part of the key as loaders return them (working file name, shapefile parts)
+def content_hash(loader_name, uploaded_files):
+    # loader_name       : Name of the loader, so different loaders of the same bytes do not share an entry. The format
+    #                     version of the loader is part of the hash
+    # uploaded_files    : One uploaded file or a list of them (Streamlit UploadedFile or any BytesIO with a name)
+    if not isinstance(uploaded_files, (list, tuple)):
+        uploaded_files = [uploaded_files]
+    hasher = hashlib.sha256(f"{loader_name}/v{loader_versions.get(loader_name, 1)}".encode())
+    for uploaded_file in uploaded_files:
+        hasher.update(getattr(uploaded_file, "name", "").encode())
+        hasher.update(uploaded_file.getbuffer())
+    return hasher.hexdigest()
+
+# Total size of the files in a folder
+def folder_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+# Read an entry back. Return None if the entry is missing or broken
+def read_entry(key):
+    entry_dir = os.path.join(CACHE_DIR, key)
+    manifest_path = os.path.join(entry_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        items = []
+        for i, item in enumerate(manifest["items"]):
+            if item["kind"] == "geo":
+                items.append(gpd.read_parquet(os.path.join(entry_dir, f"item_{i}.parquet")))
+            elif item["kind"] == "frame":
+                items.append(pd.read_parquet(os.path.join(entry_dir, f"item_{i}.parquet")))
+            else:
+                items.append(item["value"])
+        # Touch the manifest, its modified time is the last used time for the LRU eviction
+        os.utime(manifest_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return tuple(items) if manifest["is_tuple"] else items[0]
+
+# Write an entry. The result is skipped (not cached) if any value can not be stored
+def write_entry(key, result):
+    entry_dir = os.path.join(CACHE_DIR, key)
+    temp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+    is_tuple = isinstance(result, tuple)
+    try:
+        os.makedirs(temp_dir, exist_ok=True)
+        manifest = {"is_tuple": is_tuple, "created": time.time(), "items": []}
+        for i, value in enumerate(result if is_tuple else (result,)):
+            if isinstance(value, gpd.GeoDataFrame):
+                value.to_parquet(os.path.join(temp_dir, f"item_{i}.parquet"))
+                manifest["items"].append({"kind": "geo"})
+            elif isinstance(value, pd.DataFrame):
+                value.to_parquet(os.path.join(temp_dir, f"item_{i}.parquet"))
+                manifest["items"].append({"kind": "frame"})
+            else:
+                json.dumps(value)   # Raise if the value is not a plain value
+                manifest["items"].append({"kind": "json", "value": value})
+        with open(os.path.join(temp_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+        # Publish the entry in one step, so a reader never sees a half written entry
+        os.replace(temp_dir, entry_dir)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        return
+    evict()
+
+# Remove the least recently used entries until the cache is under its size limit
+def evict(max_bytes=None):
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        manifest_path = os.path.join(entry.path, MANIFEST)
+        if entry.is_dir() and os.path.exists(manifest_path):
+            entries.append((os.stat(manifest_path).st_mtime, folder_size(entry.path), entry.path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_bytes = total_bytes - size
+
+# Decorator for a loader taking the uploaded file(s) as the first argument. Put it under @shared_dataset, so the
+# shared in-memory dataset is checked first and the disk cache is only read once per server process.
+# Bump the version whenever the loader returns something different for the same upload.
+# The caller can pass the content hash of the upload as dataset_key, so a large upload is only hashed once
+def disk_cache(loader_name, version=1):
+    loader_versions[loader_name] = version
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(uploaded_files, *args, dataset_key=None, **kwargs):
+            # Nothing uploaded yet, nothing to cache
+            if not uploaded_files:
+                return func(uploaded_files, *args, **kwargs)
+            key = dataset_key or content_hash(loader_name, uploaded_files)
+            result = read_entry(key)
+            if result is None:
+                result = func(uploaded_files, *args, **kwargs)
+                if result is not None:
+                    write_entry(key, result)
+            return result
+        # Tells @shared_dataset to pass its key down
+        wrapper.takes_dataset_key = True
+        return wrapper
+    return decorator
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+# Local queue of the long jobs (profiling reports, bulk exports, large aggregations), run by a pool of worker threads
+# of the server instead of the script thread of a session, so the page stays usable while a job runs.
+# Each job has an id, a folder of artefacts and a status file:
+#   <JOBS_DIR>/<job_id>/status.json     : state (queued, running, done, failed, cancelled), progress, message, error
+#   <JOBS_DIR>/<job_id>/<artefact>      : the files written by the job (e.g. report.html)
+# The status is on disk, so the next rerun of any session (or a restarted server) picks up the finished artefacts.
+# The id is made from the kind of job and a key (e.g. the content key of the dataset): the same job is never run twice.
+
+# Jobs folder and number of worker threads, can be changed by environment variables
+JOBS_DIR = os.environ.get("GG_JOBS_DIR", os.path.join(".cache", "jobs"))
+JOB_WORKERS = int(os.environ.get("GG_JOB_WORKERS", "2"))
+
+STATUS = "status.json"
+finished_states = ["done", "failed", "cancelled"]
+
+# Raised in a job (by Job.progress) when the job was cancelled, stops the job at its next progress report
+class JobCancelled(Exception):
+    pass
+
+# Handle given to the job function: where to write the artefacts, and how to report the progress
+class Job:
+    def __init__(self, queue, job_id, folder):
+        self.queue = queue
+        self.id = job_id
+        self.folder = folder
+
+    # Path of an artefact of the job
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    # Report the progress (0 to 1) with a message. Stops the job here if it was cancelled
+    def progress(self, fraction, message=""):
+        if self.queue.is_cancelled(self.id):
+            raise JobCancelled()
+        self.queue.update(self.id, state="running", progress=float(fraction), message=message)
+
+# Write the status of a job in one step, so a reader never sees a half written file
+def write_status(folder, status):
+    temp_path = os.path.join(folder, f"{STATUS}.tmp-{os.getpid()}-{threading.get_ident()}")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(temp_path, os.path.join(folder, STATUS))
+
+# Status of a job from its folder, None if there is no such job
+def read_status(folder):
+    try:
+        with open(os.path.join(folder, STATUS), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Id of the job of a kind and key, without submitting it
+def job_id_of(kind, key):
+    return f"{kind}-{hashlib.sha256(str(key).encode()).hexdigest()[:16]}"
+
+class JobQueue:
+    def __init__(self, workers, jobs_dir):
+        self.jobs_dir = jobs_dir
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.lock = threading.Lock()
+        self.active = {}        # job_id -> {"future", "cancel": threading.Event}
+
+    def folder(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def is_cancelled(self, job_id):
+        with self.lock:
+            active = self.active.get(job_id)
+        return active is not None and active["cancel"].is_set()
+
+    # Change some fields of the status of a job
+    def update(self, job_id, **fields):
+        folder = self.folder(job_id)
+        with self.lock:
+            status = read_status(folder) or {}
+            status.update(fields, updated=time.time())
+            write_status(folder, status)
+
+    # Submit a job, func(job, *args), unless the same job is running or has finished. Return the job id
+    def submit(self, kind, key, func, *args, title=""):
+        # kind              : Kind of job (e.g. "profile_report"), one folder name per kind and key
+        # key               : Key of the input of the job (e.g. the content key of the dataset)
+        # func              : The job function, called as func(job, *args) in a worker thread. It writes its artefacts
+        #                     at job.path(name) and reports its progress by job.progress(fraction, message)
+        # title             : Text shown with the job
+        job_id = job_id_of(kind, key)
+        folder = self.folder(job_id)
+        with self.lock:
+            if job_id in self.active:
+                return job_id
+            status = read_status(folder)
+            if status is not None and status["state"] == "done":
+                return job_id
+            # A new job, or a job to run again (failed, cancelled, or interrupted by a server restart)
+            shutil.rmtree(folder, ignore_errors=True)
+            os.makedirs(folder, exist_ok=True)
+            now = time.time()
+            write_status(folder, {"job_id": job_id, "kind": kind, "title": title, "state": "queued", "progress": 0.0,
+                                  "message": "Waiting for a worker", "error": "", "created": now, "updated": now})
+            cancel = threading.Event()
+            self.active[job_id] = {"cancel": cancel, "future": self.pool.submit(self.run, job_id, func, args)}
+        return job_id
+
+    # Run a job in a worker thread and record how it ended
+    def run(self, job_id, func, args):
+        try:
+            job = Job(self, job_id, self.folder(job_id))
+            job.progress(0.0, "Started")
+            func(job, *args)
+            self.update(job_id, state="done", progress=1.0, message="Finished")
+        except JobCancelled:
+            self.update(job_id, state="cancelled", message="Cancelled")
+        except Exception as e:
+            self.update(job_id, state="failed", message="Failed", error=str(e))
+        finally:
+            with self.lock:
+                self.active.pop(job_id, None)
+
+    # Ask a job to stop. A queued job never starts, a running job stops at its next progress report
+    def cancel(self, job_id):
+        with self.lock:
+            active = self.active.get(job_id)
+            if active is None:
+                return
+            active["cancel"].set()
+            not_started = active["future"].cancel()
+            if not_started:
+                self.active.pop(job_id)
+        if not_started:
+            self.update(job_id, state="cancelled", message="Cancelled")
+
+    # Status of a job, None if there is no such job. A job left running by a stopped server is shown as interrupted
+    def status(self, job_id):
+        status = read_status(self.folder(job_id))
+        if status is None:
+            return None
+        with self.lock:
+            active = job_id in self.active
+        if status["state"] not in finished_states and not active:
+            status.update(state="failed", error="Interrupted (the server was stopped)")
+        return status
+
+    # Remove a finished job and its artefacts
+    def remove(self, job_id):
+        with self.lock:
+            if job_id not in self.active:
+                shutil.rmtree(self.folder(job_id), ignore_errors=True)
+
+    # Status of all jobs (of one kind), the newest first
+    def jobs(self, kind=None):
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        statuses = [self.status(job_id) for job_id in os.listdir(self.jobs_dir)]
+        statuses = [s for s in statuses if s is not None and (kind is None or s.get("kind") == kind)]
+        return sorted(statuses, key=lambda s: s["created"], reverse=True)
+
+# One queue for the whole server process (st.cache_resource keeps it across reruns and sessions)
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(JOB_WORKERS, JOBS_DIR)
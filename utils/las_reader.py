@@ -0,0 +1,206 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+import lasio
+
+# Fast reading of LAS files (version 2.0 or older). The header sections (small) are parsed by lasio, the data section
+# (~A, nearly all of the file) is parsed by the C reader of pandas straight from the uploaded bytes: the file is never
+# decoded to one big Python string and the values are never handled one by one in Python.
+# Files the fast path can not read (wrapped lines, text values, a wrong number of values, ...) are read by lasio.
+# Both paths end with the same normalization: NULL values to NaN, curves as float32 where the precision allows, the
+# depth as a contiguous float64 array, and no parser objects (data arrays of lasio) kept alive.
+
+# Encoding of the header sections (the data section is plain numbers)
+las_encoding = "Windows-1252"
+
+# Start of the data section: a line starting with ~A
+data_section_pattern = re.compile(rb"^[ \t]*~A", re.IGNORECASE | re.MULTILINE)
+
+# NULL line of the ~W section, read from the raw header when lasio could not parse it
+null_line_pattern = re.compile(rb"^[ \t]*NULL[ \t]*(?:\.[^ \t:]*)?[ \t]+([-+0-9.eE]+)", re.IGNORECASE | re.MULTILINE)
+# NULL value of the LAS standard, for the files without a NULL line
+default_null_value = -999.25
+
+# Most decimals looked for in the curve values. A curve written with more decimals is only stored as float32 if
+# float32 holds its values exactly
+max_stored_decimals = 6
+
+# Read the data section with the fast path. Return the DataFrame of the curves (indexed by the first curve like
+# lasio's las.df()), or None if the file must be read by lasio
+def read_data_section(raw, data_start, las):
+    # raw               : The bytes of the LAS file
+    # data_start        : Offset of the first data line in raw
+    # las               : The lasio LASFile of the header sections (read with ignore_data=True)
+    wrap = str(las.version["WRAP"].value).strip().upper() if "WRAP" in las.version else "NO"
+    mnemonics = [curve.mnemonic for curve in las.curves]
+    if wrap != "NO" or not mnemonics:
+        return None
+
+    # BytesIO over the bytes object does not copy it, the reader starts at the data section
+    buffer = io.BytesIO(raw)
+    buffer.seek(data_start)
+    try:
+        values = pd.read_csv(buffer, sep=r"\s+", header=None, comment="#", dtype=np.float64, engine="c").to_numpy()
+    except (ValueError, pd.errors.ParserError):
+        # Text values, or lines with more values than the first one
+        return None
+    if values.shape[1] != len(mnemonics) or np.isnan(values[:, -1]).any():
+        # A wrong number of curves, or short lines (the missing values are read as NaN)
+        return None
+
+    well_data_df = pd.DataFrame(values[:, 1:], columns=mnemonics[1:], index=pd.Index(values[:, 0], name=mnemonics[0]))
+    return well_data_df
+
+# NULL value of the file: from the ~W section parsed by lasio, else from the raw NULL line (a slightly malformed line
+# that lasio skipped), else the default of the standard
+def null_value_of(las, raw_header):
+    # las               : The lasio LASFile
+    # raw_header        : The bytes of the header sections
+    try:
+        return float(las.well["NULL"].value)
+    except (KeyError, TypeError, ValueError):
+        pass
+    match = null_line_pattern.search(raw_header)
+    try:
+        return float(match.group(1)) if match else default_null_value
+    except ValueError:
+        return default_null_value
+
+# True if every value of a curve is written with at most this number of decimals (whole numbers once scaled, up to
+# the rounding of float64 itself)
+def has_decimals(column, decimals):
+    # column            : numpy array of the curve (NaN for the missing values)
+    scaled = column * 10.0 ** decimals
+    remainder = np.abs(scaled - np.round(scaled))
+    with np.errstate(invalid="ignore"):
+        return bool(np.all((remainder <= 1e-6 + np.abs(scaled) * 1e-15) | np.isnan(column)))
+
+# True if a curve can be stored as float32: every value must still round to the value written in the file (the error
+# below half of its last decimal). The float32 error of the curve tells how many decimals it may have at most, then
+# only that one number of decimals is checked
+def fits_float32(column, as_float32):
+    # column            : numpy array of the curve in float64 (NaN for the missing values)
+    # as_float32        : the same curve in float32
+    with np.errstate(invalid="ignore", over="ignore"):
+        error = np.abs(as_float32.astype(np.float64) - column)
+    max_error = np.max(error, initial=0.0, where=~np.isnan(error))
+    if max_error == 0:
+        return True
+    if not np.isfinite(max_error):
+        # Values too large for float32
+        return False
+    # Most decimals for which the error is below half of the last decimal
+    decimals = min(int(np.floor(-np.log10(2 * max_error))), max_stored_decimals)
+    if 0.5 * 10.0 ** -decimals <= max_error:
+        decimals = decimals - 1
+    return decimals >= 0 and has_decimals(column, decimals)
+
+# Normalize the curves of a log, one curve at a time (no temporary copies of the whole log): NULL values to NaN, curves
+# to float32 where the precision allows (the depth stays float64, as a contiguous array)
+def normalize_log(well_data_df, null_value):
+    # well_data_df      : The curves, indexed by the depth (as from las.df())
+    # null_value        : The NULL value of the file
+    columns = {}
+    for col in well_data_df.columns:
+        if not pd.api.types.is_numeric_dtype(well_data_df[col]):
+            # Text curves (lasio fallback only) are kept as they are
+            columns[col] = well_data_df[col].to_numpy()
+            continue
+        column = well_data_df[col].to_numpy(dtype=np.float64)
+        column = np.where(column == null_value, np.nan, column)
+        # float32 keeps about 7 significant digits, a curve written with more precision is kept in float64
+        with np.errstate(over="ignore"):
+            as_float32 = column.astype(np.float32)
+        columns[col] = as_float32 if fits_float32(column, as_float32) else column
+    
+    depth = np.array(well_data_df.index.to_numpy(dtype=np.float64), order="C")
+    depth[depth == null_value] = np.nan
+    # The new arrays are taken as they are (not copied again into one block)
+    return pd.DataFrame(columns, index=pd.Index(depth, name=well_data_df.index.name), copy=False)
+
+# Memory of the curves of a log, compared with the float64 frame lasio returns
+def memory_report(well_data_df):
+    # well_data_df      : The curves (the depth as the first column or the index)
+    # Return a DataFrame of the curves (and a Total row): type, bytes as float64, bytes now and the saving
+    rows = len(well_data_df)
+    report = pd.DataFrame({"Type": well_data_df.dtypes.astype(str),
+                           "Bytes (float64)": rows * 8,
+                           "Bytes": well_data_df.memory_usage(index=False, deep=True)})
+    report.loc["Total"] = ["", report["Bytes (float64)"].sum(), report["Bytes"].sum()]
+    report["Saved (%)"] = (100 * (1 - report["Bytes"] / report["Bytes (float64)"].where(report["Bytes (float64)"] > 0))).round(1)
+    return report
+
+# Read a LAS file from its bytes. Return the normalized DataFrame of the curves (indexed by the first curve) and the
+# lasio LASFile with the header sections only (well, curves, params, other)
+def read_las(raw):
+    # raw               : The bytes of the LAS file (e.g. uploaded_file.getvalue())
+    match = data_section_pattern.search(raw)
+    raw_header = raw[:match.start()] if match is not None else raw[:65536]
+    if match is not None:
+        # The first data line comes after the ~A line (which may hold the curve names)
+        line_end = raw.find(b"\n", match.end())
+        data_start = len(raw) if line_end < 0 else line_end + 1
+        try:
+            las = lasio.read(io.StringIO(raw_header.decode(las_encoding)), ignore_data=True)
+            well_data_df = read_data_section(raw, data_start, las)
+        except Exception:
+            well_data_df = None
+        if well_data_df is not None:
+            return normalize_log(well_data_df, null_value_of(las, raw_header)), las
+
+    # Fallback for the files the fast path can not read: the lasio line parser over the whole decoded file
+    las = lasio.read(io.StringIO(raw.decode(las_encoding)), engine="normal")
+    well_data_df = normalize_log(las.df(), null_value_of(las, raw_header))
+    # Drop the data arrays of lasio, only the headers are kept
+    for curve in las.curves:
+        curve.data = np.empty(0)
+    return well_data_df, las
+
+# Convert the header sections of a LAS file to dataframes (all values as text). Return the well, curves, parameter and
+# other information tables and the well name (the file name if the header has none)
+def las_header_tables(las, well_data_df, file_name):
+    # las               : The lasio LASFile (from read_las)
+    # well_data_df      : The data of the curves, for the number of points
+    # file_name         : Name of the LAS file
+    
+    # Have to use try-exception for each header section due to header of las file is very offen get error during parsing
+    try:        
+        # Convert each header section to a dataframe
+        well_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Value': item.value, 'Description': item.descr}
+                  for item in las.well]
+        well_header_df = pd.DataFrame(well_header).astype(str)   # -> This is a dataframe of all well information
+        # Dig out well name 
+        well_name = well_header_df.loc[well_header_df["Name"]=="WELL", "Value"].values[0]
+        # If there is no well name in the header, let it to be the working file name
+        if not well_name:
+            well_name = file_name
+    except:
+        well_header_df, well_name = pd.DataFrame(), file_name
+    
+    try:
+        #Convert well curve section to a dataframe
+        curves_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Description': item.descr, 
+                          'Original name': item.original_mnemonic, 'Number of points': len(well_data_df)}
+                  for item in las.curves]
+        curves_header_df = pd.DataFrame(curves_header).astype(str)   # -> This is a dataframe of all curve information
+    except:
+        curves_header_df = pd.DataFrame()
+    
+    try:
+        # Convert well params section to a dataframe
+        parameter_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Value': item.value, 'Description': item.descr}
+                  for item in las.params]
+        parameter_header_df = pd.DataFrame(parameter_header).astype(str)   # -> This is a dataframe of all parameter information
+    except:
+        parameter_header_df = pd.DataFrame()
+    
+    try:
+        # Convert well other section to a dataframe
+        other_header = [{'Name': item.mnemonic, 'Unit': item.unit, 'Value': item.value, 'Description': item.descr}
+                  for item in las.other]
+        other_header_df = pd.DataFrame(other_header).astype(str)   # -> This is a dataframe of all other information
+    except:
+        other_header_df = pd.DataFrame()
+    
+    return well_header_df, well_name, curves_header_df, parameter_header_df, other_header_df
@@ -0,0 +1,28 @@
+import os
+import io
+
+# Local input files of the command line tools (batch export, LAS ingestion), opened like the files of the uploaders
+
+# Paths of the files given on the command line. Folders are searched for the files with the given extensions
+def find_files(paths, extensions=None):
+    # paths             : File or folder paths
+    # extensions        : Extensions (lower case, e.g. (".las", ".zip")) of the files to take from the folders
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                file_paths.extend(os.path.join(folder, name) for name in sorted(names)
+                                  if extensions is None or name.lower().endswith(tuple(extensions)))
+        else:
+            file_paths.append(path)
+    return file_paths
+
+# Open the input paths like uploaded files (bytes with a name), for the loaders of the pages
+def open_inputs(paths, extensions=None):
+    uploaded_files = []
+    for file_path in find_files(paths, extensions):
+        with open(file_path, "rb") as f:
+            uploaded_file = io.BytesIO(f.read())
+        uploaded_file.name = os.path.basename(file_path)
+        uploaded_files.append(uploaded_file)
+    return uploaded_files
@@ -0,0 +1,70 @@
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+from utils.curve_stats import curve_stats
+from utils.disk_cache import read_entry, write_entry
+
+# Fast exploration data analysis of a well log, the quick alternative to the full ydata ProfileReport: per-curve
+# summaries, the correlation matrix, histograms and the missing intervals, all vectorized. Very large logs can be
+# sampled (every Nth depth step, so the depth order is kept). The results are cached by the content of the log, in
+# memory and on disk, so a log is only analysed once
+
+# Number of depth steps above which the log is sampled for the summaries and the correlations (the missing intervals
+# always use all depth steps)
+eda_max_rows = 500000
+
+# Every Nth row of a log, so no more than max_rows rows are left. Return the rows and the step N
+def sample_rows(df, max_rows):
+    step = max(1, int(np.ceil(len(df) / max_rows))) if max_rows else 1
+    return df.iloc[::step], step
+
+# Runs of missing values of every curve, found in one pass over the null mask of all curves
+def missing_intervals(df):
+    # df                : The log (the depth as the first column)
+    # Return a DataFrame of curve, top and base depth, number of missing samples (longest first)
+    depth = df.iloc[:, 0].to_numpy(dtype=float)
+    curves = df.columns[1:]
+    mask = df[curves].isna().to_numpy().T.astype(np.int8)   # One row per curve
+    # +1 where a run of missing values starts, -1 after it ends
+    edges = np.diff(mask, axis=1, prepend=0, append=0)
+    curve_starts, starts = np.nonzero(edges == 1)
+    _, stops = np.nonzero(edges == -1)
+    intervals = pd.DataFrame({"curve": np.asarray(curves, dtype=object)[curve_starts].astype(str),
+                              "top": depth[starts], "base": depth[stops - 1], "samples": stops - starts})
+    return intervals.sort_values("samples", ascending=False, kind="stable").reset_index(drop=True)
+
+# Analyse a log. Return the curve summaries, the correlation matrix, the missing intervals and the sampling step
+def eda_summary(df, max_rows=eda_max_rows):
+    # df                : The log (the depth as the first column)
+    # max_rows          : Sample the log above this number of rows, None for no sampling
+    sample, step = sample_rows(df, max_rows)
+    numeric = sample.apply(pd.to_numeric, errors="coerce")
+
+    # Curve summaries: the curve statistics (range, nulls, percentiles, histogram) plus the spread
+    summary = curve_stats(numeric)
+    values = numeric.to_numpy(dtype=np.float64)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        summary.insert(5, "std", np.nanstd(values, axis=0) if len(values) else np.nan)
+        summary.insert(6, "median", np.nanmedian(values, axis=0) if len(values) else np.nan)
+
+    # Pearson correlations of all curve pairs (on the samples where both curves have values)
+    correlation = numeric.corr()
+    correlation.index = correlation.columns = [str(col) for col in correlation.columns]
+    return summary, correlation, missing_intervals(df), step
+
+# Analyse a log, or get the analysis from the disk cache (shared by all sessions and kept across server restarts)
+def cached_eda(dataset_key, df, max_rows=eda_max_rows):
+    # dataset_key       : Content key of the log (e.g. the content hash of the upload)
+    # df                : The log (the depth as the first column)
+    # max_rows          : Sample the log above this number of rows, None for no sampling
+    key = hashlib.sha256(f"{dataset_key}/eda/{max_rows}".encode()).hexdigest()
+    result = read_entry(key)
+    if result is None:
+        result = eda_summary(df, max_rows)
+        write_entry(key, result)
+    else:
+        # Parquet gives the histograms back as arrays
+        result[0]["histogram"] = result[0]["histogram"].map(list)
+    return result
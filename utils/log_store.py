@@ -0,0 +1,209 @@
+import os
+import io
+import time
+import zipfile
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.las_reader import read_las, las_header_tables
+
+# On-disk columnar store of well logs, filled by a bulk ingestion of many LAS files (or zips of them) parsed across a
+# process pool. Each LAS file is parsed once, later sessions read any well or curve subset straight from Parquet.
+# Layout of the store:
+#   catalog.parquet                     : one row per ingested LAS file (well, file, curves, depth range, ...)
+#   data/well=<well>/<log_id>.parquet   : the curves of one LAS file, partitioned by well
+#   headers/<log_id>/<section>.parquet  : the header tables (well, curves, parameter, other) of the LAS file
+
+# Store folder and number of parsing processes, can be changed by environment variables
+STORE_DIR = os.environ.get("GG_LOG_STORE_DIR", os.path.join(".cache", "log_store"))
+INGEST_WORKERS = int(os.environ.get("GG_INGEST_WORKERS", "0")) or os.cpu_count()
+
+CATALOG = "catalog.parquet"
+header_sections = ["well", "curves", "parameter", "other"]
+catalog_columns = ["log_id", "well_name", "file_name", "rows", "curves", "depth_min", "depth_max", "depth_unit",
+                   "data_path", "ingested"]
+
+# The catalog is rewritten by one thread at a time (ingestions from several sessions)
+catalog_lock = threading.Lock()
+
+# Name usable as a folder name
+def safe_name(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name)) or "_"
+
+# Write a table to Parquet in one step, so a reader never sees a half written file
+def write_parquet_atomic(df, path):
+    temp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temp_path)
+    os.replace(temp_path, path)
+
+# Expand the uploaded files (LAS files and zips of LAS files) into a list of (file name, bytes)
+def expand_uploads(uploaded_files):
+    las_files = []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(uploaded_file.getvalue())) as zip_file:
+                for member in zip_file.namelist():
+                    if member.lower().endswith(".las") and not member.startswith("__MACOSX"):
+                        las_files.append((os.path.basename(member), zip_file.read(member)))
+        else:
+            las_files.append((uploaded_file.name, uploaded_file.getvalue()))
+    return las_files
+
+# Expand local LAS files and zips of them (e.g. from the command line) into a list of (file name, source) without
+# reading them: the source is the file path, or a (zip file path, member name) pair. The workers read the files
+def expand_paths(file_paths):
+    las_files = []
+    for file_path in file_paths:
+        if file_path.lower().endswith(".zip"):
+            with zipfile.ZipFile(file_path) as zip_file:
+                for member in zip_file.namelist():
+                    if member.lower().endswith(".las") and not member.startswith("__MACOSX"):
+                        las_files.append((os.path.basename(member), (file_path, member)))
+        else:
+            las_files.append((os.path.basename(file_path), file_path))
+    return las_files
+
+# Open a LAS file source for reading: bytes (an upload), a file path, or a (zip file path, member name) pair
+def open_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    if isinstance(source, tuple):
+        zip_path, member = source
+        with zipfile.ZipFile(zip_path) as zip_file:
+            return io.BytesIO(zip_file.read(member))
+    return open(source, "rb")
+
+# Id of a LAS file in the store: a hash of its content, so the same file is never parsed twice. Files are hashed in
+# blocks, never read whole
+def log_id_of(source):
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()[:24]
+    hasher = hashlib.sha256()
+    if isinstance(source, tuple):
+        zip_path, member = source
+        with zipfile.ZipFile(zip_path) as zip_file, zip_file.open(member) as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+    return hasher.hexdigest()[:24]
+
+# Parse one LAS file and write its curves and header tables into the store. Runs in a worker process, only the
+# catalog row is sent back (not the data)
+def ingest_one(file_name, source, store_dir, log_id=None):
+    # file_name         : Name of the LAS file
+    # source            : The bytes of the LAS file, or where to read it (see open_source)
+    # store_dir         : Folder of the store
+    # log_id            : Id of the file if already known
+    with open_source(source) as f:
+        raw = f.read()
+    log_id = log_id or log_id_of(raw)
+    well_data_df, las = read_las(raw)
+    well_data_df = well_data_df.reset_index()
+    well_header_df, well_name, curves_header_df, parameter_header_df, other_header_df = \
+        las_header_tables(las, well_data_df, file_name)
+
+    header_dir = os.path.join(store_dir, "headers", log_id)
+    os.makedirs(header_dir, exist_ok=True)
+    for section, header_df in zip(header_sections, (well_header_df, curves_header_df, parameter_header_df, other_header_df)):
+        write_parquet_atomic(pd.DataFrame(header_df), os.path.join(header_dir, f"{section}.parquet"))
+
+    data_path = os.path.join("data", f"well={safe_name(well_name)}", f"{log_id}.parquet")
+    os.makedirs(os.path.dirname(os.path.join(store_dir, data_path)), exist_ok=True)
+    # Curve names must be text for Parquet
+    well_data_df.columns = [str(col) for col in well_data_df.columns]
+    write_parquet_atomic(well_data_df, os.path.join(store_dir, data_path))
+
+    depth = well_data_df.iloc[:, 0]
+    depth_unit = str(curves_header_df["Unit"].iloc[0]) if len(curves_header_df) else ""
+    return {"log_id": log_id, "well_name": str(well_name), "file_name": file_name, "rows": len(well_data_df),
+            "curves": ",".join(well_data_df.columns), "depth_min": float(depth.min()), "depth_max": float(depth.max()),
+            "depth_unit": depth_unit, "data_path": data_path, "ingested": time.time()}
+
+# The catalog of the store (one row per LAS file), empty if nothing was ingested yet
+def load_catalog(store_dir=None):
+    catalog_path = os.path.join(store_dir or STORE_DIR, CATALOG)
+    if not os.path.exists(catalog_path):
+        return pd.DataFrame(columns=catalog_columns)
+    return pd.read_parquet(catalog_path)
+
+# Ingest many LAS files across a process pool. The files already in the store are skipped
+def ingest_las_files(las_files, workers=None, store_dir=None, progress=None):
+    # las_files         : List of (file name, bytes), e.g. from expand_uploads, or of (file name, source) from
+    #                     expand_paths (the files are then read by the workers, not by this process)
+    # workers           : Number of worker processes (default INGEST_WORKERS)
+    # store_dir         : Folder of the store (default STORE_DIR)
+    # progress          : Optional function called as progress(done, total, file_name) after each file. It may raise
+    #                     to stop the ingestion (e.g. a cancelled job), the files done so far are kept
+    # Return the catalog rows of the new files and a list of (file name, error) of the files that could not be read
+    store_dir = store_dir or STORE_DIR
+    os.makedirs(store_dir, exist_ok=True)
+    known = set(load_catalog(store_dir)["log_id"])
+    todo, seen = [], set()
+    for file_name, source in las_files:
+        log_id = log_id_of(source)
+        if log_id not in known and log_id not in seen:
+            todo.append((file_name, source, log_id))
+            seen.add(log_id)
+
+    rows, errors = [], []
+    try:
+        if todo:
+            # Spawned (not forked) workers: forking the multithreaded Streamlit server is not safe
+            with ProcessPoolExecutor(max_workers=min(workers or INGEST_WORKERS, len(todo)),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = {pool.submit(ingest_one, file_name, source, store_dir, log_id): file_name
+                           for file_name, source, log_id in todo}
+                try:
+                    for done, future in enumerate(as_completed(futures), start=1):
+                        try:
+                            rows.append(future.result())
+                        except Exception as e:
+                            errors.append((futures[future], str(e)))
+                        if progress is not None:
+                            progress(done, len(todo), futures[future])
+                except BaseException:
+                    # Stopped (e.g. a cancelled job): the files not started yet are dropped
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+    finally:
+        # Add the new files to the catalog (also the ones done before a stop)
+        if rows:
+            with catalog_lock:
+                catalog = pd.concat([load_catalog(store_dir), pd.DataFrame(rows, columns=catalog_columns)], ignore_index=True)
+                catalog = catalog.drop_duplicates("log_id", keep="last").sort_values(["well_name", "file_name"])
+                write_parquet_atomic(catalog.reset_index(drop=True), os.path.join(store_dir, CATALOG))
+    return rows, errors
+
+# Read the curves of one LAS file from the store, all curves or a subset (the depth curve always comes first)
+def read_log(log_id, curves=None, store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    catalog = load_catalog(store_dir)
+    entry = catalog[catalog["log_id"] == log_id].iloc[0]
+    columns = None
+    if curves is not None:
+        depth_curve = entry["curves"].split(",")[0]
+        columns = [depth_curve] + [curve for curve in curves if curve != depth_curve and curve in entry["curves"].split(",")]
+    return pd.read_parquet(os.path.join(store_dir, entry["data_path"]), columns=columns)
+
+# Read the header tables (well, curves, parameter, other) of one LAS file from the store
+def read_headers(log_id, store_dir=None):
+    header_dir = os.path.join(store_dir or STORE_DIR, "headers", log_id)
+    return tuple(pd.read_parquet(os.path.join(header_dir, f"{section}.parquet")) for section in header_sections)
+
+# Read a subset of wells and curves of the store as one table, with the well name and the log id of each sample
+def query_logs(wells=None, curves=None, store_dir=None):
+    # wells             : List of well names (default all wells)
+    # curves            : List of curve names (default all curves). A LAS file without a curve gets blanks
+    catalog = load_catalog(store_dir)
+    if wells is not None:
+        catalog = catalog[catalog["well_name"].isin(wells)]
+    tables = [read_log(log_id, curves, store_dir).assign(well_name=well_name, log_id=log_id)
+              for log_id, well_name in zip(catalog["log_id"], catalog["well_name"])]
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
@@ -0,0 +1,214 @@
+import io
+import zipfile
+import numpy as np
+import pandas as pd
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Loading, checking and partitioning of the well tops and DSTs data, shared by the DSTs and Tops page and the batch export
+
+# Expected columns and their types of the two tables (see the Data file example TAB). The plots and the tables of the
+# page use the column positions, so the loaded tables are always put in this column order (extra columns come after)
+well_top_schema = {"well_name": "string", "surface_name": "string", "surface_tvd_m": "float64",
+                   "surface_md_m": "float64", "surface_twt_ms": "float64"}
+well_dst_schema = {"well_name": "string", "well_td_m": "float64", "dst_number": "Int64",
+                   "dst_depth_top_m": "float64", "dst_depth_base_m": "float64", "dst_result": "string"}
+# Columns that must be in the file. The other columns of the schema are filled with blanks if missing
+well_top_required = ["well_name", "surface_name", "surface_md_m"]
+well_dst_required = ["well_name", "dst_number", "dst_depth_top_m", "dst_depth_base_m"]
+
+# Read the sheets (by default "well_top" and "well_dst") of a xlsx workbook, opening (unzipping) the workbook only once.
+# The rows are streamed in read-only mode. A file that is not a workbook raises ValueError naming the file
+def read_xlsx_sheets(uploaded_file, sheet_names=("well_top", "well_dst")):
+    try:
+        workbook = openpyxl.load_workbook(io.BytesIO(uploaded_file.getvalue()), read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ValueError(f"{uploaded_file.name} is not a valid Excel workbook (corrupt, or not a xlsx/xlsm file): {e}")
+    try:
+        sheets = {}
+        for sheet_name in sheet_names:
+            if sheet_name not in workbook.sheetnames:
+                raise ValueError(f'The workbook {uploaded_file.name} has no sheet named "{sheet_name}"')
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            # Skip the empty rows (formatted but blank rows are often found at the end of a sheet)
+            records = [row for row in rows if any(value is not None for value in row)]
+            sheet_df = pd.DataFrame.from_records(records, columns=[str(h).strip() if h is not None else None for h in header])
+            sheets[sheet_name] = sheet_df.loc[:, sheet_df.columns.notna()]
+    finally:
+        workbook.close()
+    return sheets
+
+# Check a loaded table against its schema and fix the column types and order. Raise ValueError with a clear message
+def validate_table(df, sheet_name, schema, required_columns):
+    missing = [col for col in required_columns if col not in df.columns]
+    if missing:
+        raise ValueError(f'The "{sheet_name}" data has no column {", ".join(missing)}. '
+                         f'The expected columns are: {", ".join(schema)}')
+    
+    columns = {}
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            columns[col] = pd.Series(np.nan, index=df.index).astype(dtype)
+        elif dtype == "string":
+            # Blank texts are empty values
+            columns[col] = df[col].astype("string").str.strip().replace("", pd.NA)
+        else:
+            values = pd.to_numeric(df[col], errors="coerce")
+            # Values that are filled but not numbers
+            bad = values.isna() & df[col].notna()
+            if dtype == "Int64":
+                bad = bad | (values.notna() & (values % 1 != 0))
+            if bad.any():
+                first_bad = int(np.flatnonzero(bad.to_numpy())[0])
+                raise ValueError(f'The "{sheet_name}" column {col} has {int(bad.sum())} values that are not '
+                                 f'{"whole numbers" if dtype == "Int64" else "numbers"} '
+                                 f'(first one: "{df[col].iloc[first_bad]}" at data row {first_bad + 1})')
+            columns[col] = values.astype(dtype)
+    
+    # The required columns must be filled in every row
+    for col in required_columns:
+        empty = columns[col].isna()
+        if empty.any():
+            first_empty = int(np.flatnonzero(empty.to_numpy())[0])
+            raise ValueError(f'The "{sheet_name}" column {col} has {int(empty.sum())} empty values '
+                             f'(first one at data row {first_empty + 1})')
+    # Keep the extra columns after the schema columns
+    for col in df.columns:
+        if col not in schema:
+            columns[col] = df[col]
+    return pd.DataFrame(columns)
+
+# Read the tops and DSTs from the uploaded file(s), check and sort them
+def read_top_dst(uploaded_files):
+    # uploaded_files    : One Excel workbook with the sheets "well_top" and "well_dst", or two CSV/Parquet files
+    #                     with "well_top" and "well_dst" in their names
+    if uploaded_files:
+        
+        sheets = {}
+        for uploaded_file in uploaded_files:
+            file_name = uploaded_file.name.lower()
+            if file_name.endswith((".xlsx", ".xlsm")):
+                # Read only sheets named "well_top" and "well_dst", in one pass over the workbook
+                sheets.update(read_xlsx_sheets(uploaded_file))
+            elif file_name.endswith(".xls"):
+                # Old Excel format (not supported by openpyxl): both sheets are still read in one call
+                sheets.update(pd.read_excel(uploaded_file, sheet_name=["well_top", "well_dst"]))
+            elif "well_top" in file_name or "well_dst" in file_name:
+                sheet_name = "well_top" if "well_top" in file_name else "well_dst"
+                if file_name.endswith(".parquet"):
+                    sheets[sheet_name] = pd.read_parquet(io.BytesIO(uploaded_file.getvalue()))
+                else:
+                    sheets[sheet_name] = pd.read_csv(io.BytesIO(uploaded_file.getvalue()))
+            else:
+                raise ValueError(f'Can not tell if {uploaded_file.name} is the "well_top" or the "well_dst" data. '
+                                 'Please put "well_top" or "well_dst" in the CSV/Parquet file names')
+        for sheet_name in ("well_top", "well_dst"):
+            if sheet_name not in sheets:
+                raise ValueError(f'No "{sheet_name}" data found in the uploaded files')
+        
+        # Check the columns and fix their types
+        df_well_top = validate_table(sheets["well_top"], "well_top", well_top_schema, well_top_required)
+        df_well_dst = validate_table(sheets["well_dst"], "well_dst", well_dst_schema, well_dst_required)
+        
+        # Sort the dataframes
+        df_well_top = df_well_top.sort_values(["well_name", "surface_md_m"], ascending = [True, True])
+        df_well_dst = df_well_dst.sort_values(["well_name", "dst_number"], ascending = [True, True])
+        
+        file_loaded = True
+        return df_well_top, df_well_dst, file_loaded
+
+# Split a table by well once at load time, each well as a contiguous block of rows sorted by depth
+def partition_by_well(df, depth_col, base_col=None):
+    # df                : The table (well_top or well_dst)
+    # depth_col         : Name of the depth column to sort and to search on (the top depth for DSTs)
+    # base_col          : Name of the base depth column for intervals (DSTs), None for tops
+    # Return a dict of well name -> dict of:
+    #   frame           : the rows of the well sorted by depth (index reset)
+    #   depths          : numpy array of the depths (sorted)
+    #   bases           : numpy array of the base depths, only for intervals
+    #   reach           : numpy array of the deepest base so far (running max, sorted), only for intervals
+    
+    # Rows without a well name belong to no well
+    df = df[df["well_name"].notna()]
+    df = df.sort_values(["well_name", depth_col], kind="stable").reset_index(drop=True)
+    well_names = df["well_name"].to_numpy(dtype=object)
+    depths = df[depth_col].to_numpy(dtype=float)
+    # Start and stop rows of each well in the sorted table
+    starts = np.flatnonzero(np.concatenate([[True], well_names[1:] != well_names[:-1]])) if len(df) else np.empty(0, dtype=int)
+    stops = np.append(starts[1:], len(df))
+    
+    partitions = {}
+    for start, stop in zip(starts, stops):
+        partition = {"frame": df.iloc[start:stop].reset_index(drop=True),
+                     "depths": np.ascontiguousarray(depths[start:stop])}
+        if base_col is not None:
+            partition["bases"] = np.ascontiguousarray(df[base_col].to_numpy(dtype=float)[start:stop])
+            partition["reach"] = np.fmax.accumulate(partition["bases"])
+        partitions[well_names[start]] = partition
+    return partitions
+
+# Get the rows of a well inside a depth window, found by binary search on the partition (no scan of the table)
+def rows_in_depth_window(partition, start_depth, stop_depth):
+    # partition         : The dict of the well from partition_by_well
+    # start_depth       : Start depth of the window
+    # stop_depth        : Stop depth of the window
+    start_depth, stop_depth = min(start_depth, stop_depth), max(start_depth, stop_depth)
+    # Last row with a depth (top) above the end of the window
+    last = np.searchsorted(partition["depths"], stop_depth, side="right")
+    if "reach" in partition:
+        # Intervals: first row whose base (or an earlier one) reaches the start of the window
+        first = np.searchsorted(partition["reach"], start_depth, side="left")
+        # Drop the few intervals in between that end above the window
+        return partition["frame"].iloc[first:last][partition["bases"][first:last] >= start_depth]
+    first = np.searchsorted(partition["depths"], start_depth, side="left")
+    return partition["frame"].iloc[first:last]
+
+# An empty partition, for a well without data
+def empty_partition(df):
+    return {"frame": df.iloc[0:0], "depths": np.empty(0), "bases": np.empty(0), "reach": np.empty(0)}
+
+# Label depth samples (e.g. every sample of a log) with the formation they are in and the DST interval they fall in.
+# One searchsorted pass over the sorted tops and DST tops of the well, no loop over the samples
+def label_depth_samples(depths, top_partition=None, dst_partition=None):
+    # depths            : numpy array of the sample depths (md, meters), any order
+    # top_partition     : The well_top partition of the well (from partition_by_well), None if no tops
+    # dst_partition     : The well_dst partition of the well, None if no DSTs
+    # Return a DataFrame of FORMATION (name of the top above the sample) and DST (DST interval holding the sample)
+    # as categorical columns, in the order of the samples. Samples above the first top or outside all DSTs are blank
+    depths = np.asarray(depths, dtype=float)
+    labels = {}
+    
+    formation_codes = np.full(len(depths), -1)
+    formation_names = pd.Index([])
+    if top_partition is not None and len(top_partition["depths"]):
+        name_codes, formation_names = pd.factorize(top_partition["frame"]["surface_name"].astype(str).to_numpy())
+        top_row = np.searchsorted(top_partition["depths"], depths, side="right") - 1
+        inside = (top_row >= 0) & ~np.isnan(depths)
+        formation_codes[inside] = name_codes[top_row[inside]]
+    labels["FORMATION"] = pd.Categorical.from_codes(formation_codes, categories=formation_names)
+    
+    dst_codes = np.full(len(depths), -1)
+    dst_names = pd.Index([])
+    if dst_partition is not None and len(dst_partition["depths"]):
+        name_codes, dst_names = pd.factorize(("Dst" + dst_partition["frame"]["dst_number"].astype(str)).to_numpy())
+        dst_tops, dst_bases, dst_reach = dst_partition["depths"], dst_partition["bases"], dst_partition["reach"]
+        # The last DST starting above the sample holds it if its base is below the sample
+        dst_row = np.searchsorted(dst_tops, depths, side="right") - 1
+        found = dst_row >= 0
+        inside = found.copy()
+        inside[found] = dst_bases[dst_row[found]] >= depths[found]
+        dst_codes[inside] = name_codes[dst_row[inside]]
+        # Overlapping DSTs: a sample can still be inside an earlier, longer DST. Only these few samples are checked
+        # again, interval by interval
+        covered = found.copy()
+        covered[found] = dst_reach[dst_row[found]] >= depths[found]
+        recheck = np.flatnonzero(covered & ~inside)
+        for row in range(len(dst_tops)):
+            if len(recheck) == 0:
+                break
+            hit = (depths[recheck] >= dst_tops[row]) & (depths[recheck] <= dst_bases[row])
+            dst_codes[recheck[hit]] = name_codes[row]
+            recheck = recheck[~hit]
+    labels["DST"] = pd.Categorical.from_codes(dst_codes, categories=dst_names)
+    return pd.DataFrame(labels)
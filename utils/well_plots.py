@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.ticker as ticker
+from matplotlib.collections import LineCollection, PolyCollection
+
+# Plots of the well tops and DSTs (single well and multi-well correlation), shared by the DSTs and Tops page and the
+# batch export. Each function returns a new matplotlib figure, the caller closes it
+
+# Merge the labels of the tops (or DSTs) that would overlap on the plot, so one label is drawn per group
+def declutter_labels(ax, depths, names, start_depth, stop_depth, font_size=10):
+    # ax                : The axis of the plot
+    # depths            : numpy array of the depths of the labels, sorted ascending
+    # names             : numpy array of the label texts
+    # start_depth       : Start depth(md) of the plot
+    # stop_depth        : Stop depth of the plot
+    # Return the depths and the texts of the merged labels (depths sorted ascending)
+    
+    # Nothing to merge without labels, or on a depth range collapsed to one depth
+    if len(depths) == 0 or not np.isfinite(stop_depth - start_depth) or stop_depth == start_depth:
+        return depths, list(names)
+    # Depth taken by one line of text: the plot depth range times the text height over the axis height (in pixels)
+    axis_height = ax.get_window_extent().height
+    label_gap = abs(stop_depth - start_depth) * (1.2 * font_size * ax.figure.dpi / 72) / axis_height
+    # Split the depth range into slots of one text line. The labels falling in the same slot are merged into one label,
+    # drawn at the middle of the slot, so the number of labels never grows over the number of text lines of the plot.
+    # A label alone in its slot stays at its own depth
+    top_depth = min(start_depth, stop_depth)
+    number_of_slots = max(1, int(abs(stop_depth - start_depth) // label_gap))
+    label_gap = abs(stop_depth - start_depth) / number_of_slots
+    slot = np.clip(np.floor((depths - top_depth) / label_gap).astype(int), 0, number_of_slots - 1)
+    starts = np.flatnonzero(np.diff(slot, prepend=-1))
+    counts = np.diff(np.append(starts, len(depths)))
+    texts = [names[i] if n == 1 else (" / ".join(names[i:i + n]) if n <= 3 else f"{names[i]} (+{n - 1} more)")
+             for i, n in zip(starts, counts)]
+    label_depths = np.where(counts == 1, depths[starts], top_depth + (slot[starts] + 0.5) * label_gap)
+    return label_depths, texts
+
+def well_top(df, start_depth, stop_depth, name_col, depth_col, depth_label="Depth (MDm)"):
+    # df                : The input pandas dataframe
+    # name_col          : Column (position) of the top names
+    # depth_col         : Column (position) of the top depths in measure depth(md), or in TVD/TVDSS
+    # start_depth       : Start depth(md) of borehole to plot
+    # stop_depth        : Stop depth of borehole to plot        
+    # depth_label       : Label of the depth axis
+    
+    # fig, ax = plt.subplots(figsize=(3, 5)) # The default: W=6.4in=640px; H=4.8in=480px
+    # Create a figure and a axis.        
+    fig, ax = plt.subplots()
+    
+    # Plot a wellbore with depth from start_depth to TD
+    ax.axhspan(start_depth, stop_depth, 0.2, 0.4, color="brown", alpha=1, label= "Wellbore")
+    # Set y-axis limit
+    plt.ylim(start_depth, stop_depth)    
+    
+    # Get the depths and names of the tops as numpy arrays (sorted by depth)
+    depths = df.iloc[:, depth_col].to_numpy(dtype=float)
+    names = df.iloc[:, name_col].astype(str).to_numpy()
+    order = np.argsort(depths, kind="stable")
+    depths, names = depths[order], names[order]
+    
+    # Plot all Tops as one collection of lines. x is in axis fraction (0.2 to 0.4), y is in depth
+    segments = np.stack([np.column_stack([np.full(len(depths), 0.2), depths]),
+                         np.column_stack([np.full(len(depths), 0.4), depths])], axis=1)
+    ax.add_collection(LineCollection(segments, colors="yellow", transform=ax.get_yaxis_transform()))
+    
+    # Label the tops inside the depth range, the overlapping labels are merged
+    visible = (depths >= min(start_depth, stop_depth)) & (depths <= max(start_depth, stop_depth))
+    label_depths, label_texts = declutter_labels(ax, depths[visible], names[visible], start_depth, stop_depth)
+    for label_depth, label_text in zip(label_depths, label_texts):
+        ax.text(0.5, label_depth, label_text, ha='left', va='center', transform=ax.get_yaxis_transform())
+    # Invert y axis
+    ax.invert_yaxis()
+    
+    # Set background color
+    ax.set_facecolor("pink")
+    
+    # Turn off x ticks and it's labels
+    ax.xaxis.set_major_locator(ticker.NullLocator())
+    
+    # Add legend
+    ax.legend(loc="upper right")
+    
+    # Set y-axis label position to the right
+    ax.yaxis.set_label_position("right")
+    
+    # Set y-axis label
+    ax.set_ylabel(depth_label)
+    
+    # Set x-axis label
+    ax.set_xlabel("Plot depth from " + str(start_depth) + " to " + str(stop_depth) + "m")   
+           
+    return fig
+
+def well_dst(df, start_depth, stop_depth, top_depth_col, base_depth_col, name_col, depth_label="Depth (MDm)"):
+    # df                : The input pandas dataframe
+    # top_depth_col     : Column (position) of the top depth of DST in measure depth(md), or in TVD/TVDSS
+    # base_depth_col    : Column (position) of the base depth of DST 
+    # name_col          : Column (position) of the DST number
+    # start_depth       : Start depth(md) of borehole to plot
+    # stop_depth        : Stop depth of borehole to plot  
+    # depth_label       : Label of the depth axis
+    
+    # Create default figure and ax (Figure size will be: W=6.4in=640px; H=4.8in=480px)
+    fig, ax = plt.subplots()
+    
+    # Plot a wellbore with depth from start_depth to TD
+    ax.axhspan(start_depth, stop_depth, 0.2, 0.4, color="brown", alpha=1, label= "Wellbore")        
+    # Set y-axis limit
+    plt.ylim(start_depth, stop_depth)
+    
+    # Get the DST intervals and numbers as numpy arrays (sorted by top depth)
+    tops = df.iloc[:, top_depth_col].to_numpy(dtype=float)
+    bases = df.iloc[:, base_depth_col].to_numpy(dtype=float)
+    names = ("Dst" + df.iloc[:, name_col].astype(str)).to_numpy()
+    order = np.argsort(tops, kind="stable")
+    tops, bases, names = tops[order], bases[order], names[order]
+    
+    # Plot all DSTs as one collection of rectangles (one legend entry). x is in axis fraction (0.2 to 0.4), y is in depth
+    x0, x1 = np.full(len(tops), 0.2), np.full(len(tops), 0.4)
+    verts = np.stack([np.column_stack([x0, tops]), np.column_stack([x1, tops]),
+                      np.column_stack([x1, bases]), np.column_stack([x0, bases])], axis=1)
+    ax.add_collection(PolyCollection(verts, facecolors="yellow", edgecolors="none", alpha=1, label="DSTs",
+                                     transform=ax.get_yaxis_transform()))
+    
+    # Label the DSTs inside the depth range at their top, the overlapping labels are merged
+    visible = (bases >= min(start_depth, stop_depth)) & (tops <= max(start_depth, stop_depth))
+    label_depths, label_texts = declutter_labels(ax, tops[visible], names[visible], start_depth, stop_depth)
+    for label_depth, label_text in zip(label_depths, label_texts):
+        ax.text(0.5, label_depth, label_text, ha='left', va='center', transform=ax.get_yaxis_transform())
+    # Invert y axis
+    ax.invert_yaxis()
+    
+    # Set background color
+    ax.set_facecolor("pink")
+    
+    # Turn off x ticks and it's labels
+    ax.xaxis.set_major_locator(ticker.NullLocator())
+    
+    # Add legend
+    ax.legend(loc="upper right")
+    
+    # Set y-axis label position to the right
+    ax.yaxis.set_label_position("right")
+    
+    # Set y-axis label
+    ax.set_ylabel(depth_label)
+    
+    # Set x-axis label
+    ax.set_xlabel("Plot depth from " + str(start_depth) + " to " + str(stop_depth) + "m")     
+          
+    return fig
+
+def well_correlation(df_top, df_dst, wells, start_depth, stop_depth, flatten_on=None,
+                     depth_cols=("surface_md_m", "dst_depth_top_m", "dst_depth_base_m"), depth_type="MD"):
+    # df_top            : The well_top dataframe (all wells)
+    # df_dst            : The well_dst dataframe (all wells)
+    # wells             : List of the wells to show, from left to right
+    # start_depth       : Start depth(md) to plot (relative to the flattening top if any)
+    # stop_depth        : Stop depth to plot
+    # flatten_on        : Name of the top (surface) to flatten on, None to plot in measure depth
+    # depth_cols        : Names of the depth columns of the tops, the DST tops and the DST bases (md, or TVD/TVDSS)
+    # depth_type        : Type of the depths ("MD", "TVD" or "TVDSS"), for the axis label
+    # All wells are drawn in one figure with a few collections: the tracks, the tops, the lines connecting the same top
+    # in neighbour wells and the DSTs. Nothing is drawn per well or per top
+    
+    number_of_wells = len(wells)
+    well_position = pd.Series(np.arange(number_of_wells), index=pd.Index(wells))
+    
+    # Tops and DSTs of the shown wells, with their track position (x)
+    tops = df_top[df_top["well_name"].isin(wells)]
+    dsts = df_dst[df_dst["well_name"].isin(wells)]
+    top_x = well_position.reindex(tops["well_name"]).to_numpy(dtype=float)
+    top_depth = tops[depth_cols[0]].to_numpy(dtype=float)
+    top_name = tops["surface_name"].astype(str).to_numpy()
+    dst_x = well_position.reindex(dsts["well_name"]).to_numpy(dtype=float)
+    dst_top = dsts[depth_cols[1]].to_numpy(dtype=float)
+    dst_base = dsts[depth_cols[2]].to_numpy(dtype=float)
+    
+    # Flattening: shift every well by the depth of the chosen top in that well. Wells without the top are not shown
+    shift = np.zeros(number_of_wells)
+    if flatten_on is not None:
+        datum = tops[tops["surface_name"] == flatten_on].drop_duplicates("well_name")
+        shift = np.full(number_of_wells, np.nan)
+        shift[well_position.reindex(datum["well_name"]).to_numpy()] = datum[depth_cols[0]].to_numpy(dtype=float)
+    top_depth = top_depth - shift[top_x.astype(int)]
+    dst_top = dst_top - shift[dst_x.astype(int)]
+    dst_base = dst_base - shift[dst_x.astype(int)]
+    # Drop the tops without a depth (or in a well without the flattening top)
+    valid = ~np.isnan(top_depth)
+    top_x, top_depth, top_name = top_x[valid], top_depth[valid], top_name[valid]
+    
+    # One colour per top name
+    surface_codes, surfaces = pd.factorize(top_name)
+    colors = plt.get_cmap("tab20")(surface_codes % 20)
+    
+    # The width grows with the number of wells, capped so the image stays quick to encode and to send
+    fig, ax = plt.subplots(figsize=(min(max(6.4, 0.35 * number_of_wells + 2), 30), 8))
+    
+    # Tracks (wellbores) of all wells as one collection
+    track_x = np.arange(number_of_wells, dtype=float)[~np.isnan(shift)]
+    ax.add_collection(PolyCollection(
+        np.stack([np.column_stack([track_x - 0.15, np.full(len(track_x), start_depth)]),
+                  np.column_stack([track_x + 0.15, np.full(len(track_x), start_depth)]),
+                  np.column_stack([track_x + 0.15, np.full(len(track_x), stop_depth)]),
+                  np.column_stack([track_x - 0.15, np.full(len(track_x), stop_depth)])], axis=1),
+        facecolors="brown", edgecolors="none", label="Wellbore"))
+    
+    # All DSTs as one collection, narrower than the tracks
+    ax.add_collection(PolyCollection(
+        np.stack([np.column_stack([dst_x - 0.06, dst_top]), np.column_stack([dst_x + 0.06, dst_top]),
+                  np.column_stack([dst_x + 0.06, dst_base]), np.column_stack([dst_x - 0.06, dst_base])], axis=1),
+        facecolors="yellow", edgecolors="none", label="DSTs"))
+    
+    # All tops as one collection of ticks across the tracks
+    ax.add_collection(LineCollection(
+        np.stack([np.column_stack([top_x - 0.15, top_depth]), np.column_stack([top_x + 0.15, top_depth])], axis=1),
+        colors=colors, linewidths=1.5))
+    
+    # Correlation lines: sort the tops by name then by well position, and connect each top to the same top in the
+    # next well on the right that has it
+    order = np.lexsort((top_x, surface_codes))
+    code_sorted, x_sorted, depth_sorted = surface_codes[order], top_x[order], top_depth[order]
+    pair = (code_sorted[1:] == code_sorted[:-1]) & (x_sorted[1:] > x_sorted[:-1])
+    left, right = np.flatnonzero(pair), np.flatnonzero(pair) + 1
+    ax.add_collection(LineCollection(
+        np.stack([np.column_stack([x_sorted[left] + 0.15, depth_sorted[left]]),
+                  np.column_stack([x_sorted[right] - 0.15, depth_sorted[right]])], axis=1),
+        colors=colors[order][left], linewidths=0.8, linestyles="dashed"))
+    
+    # Label each top once, on the right of the panel at its depth in the last well having it (merged if overlapping)
+    last_in_name = np.flatnonzero(np.append(code_sorted[1:] != code_sorted[:-1], True))
+    label_order = np.argsort(depth_sorted[last_in_name], kind="stable")
+    label_rows = last_in_name[label_order]
+    in_range = (depth_sorted[label_rows] >= min(start_depth, stop_depth)) & (depth_sorted[label_rows] <= max(start_depth, stop_depth))
+    label_rows = label_rows[in_range]
+    plt.xlim(-0.5, number_of_wells - 0.5)
+    plt.ylim(start_depth, stop_depth)
+    label_depths, label_texts = declutter_labels(ax, depth_sorted[label_rows], surfaces[code_sorted[label_rows]],
+                                                 start_depth, stop_depth)
+    for label_depth, label_text in zip(label_depths, label_texts):
+        ax.text(1.01, label_depth, label_text, ha='left', va='center', fontsize=8, transform=ax.get_yaxis_transform())
+    
+    # Invert y axis
+    ax.invert_yaxis()
+    
+    # Set background color
+    ax.set_facecolor("pink")
+    
+    # Well names below the tracks
+    ax.set_xticks(np.arange(number_of_wells))
+    ax.set_xticklabels(wells, rotation=90, fontsize=8)
+    
+    # Add legend
+    ax.legend(loc="upper left")
+    
+    # Set y-axis label
+    ax.set_ylabel(f"Depth ({depth_type}m)" if flatten_on is None else f"{depth_type} depth below {flatten_on} (m)")
+    # Fixed margins (room for the well names and the top labels), cheaper than tight_layout with many wells
+    fig.subplots_adjust(left=0.6 / fig.get_figwidth(), right=1 - 1.2 / fig.get_figwidth(), bottom=0.15, top=0.98)
+    
+    return fig
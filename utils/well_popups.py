@@ -0,0 +1,25 @@
+import pandas as pd
+
+# Popups of the wells of the map (General page): an HTML table of the key information of each well, rendered once for
+# all wells right after the well shapefile is loaded
+
+# Key information of well for the Popup
+popup_fields = ["TD_M", "STATUS", "RESULT", "NOTES", "COMPLETED"]
+
+# Render the popup (an HTML table of the popup_fields) of every well
+def build_well_popups(vnWells_df):
+    # vnWells_df        : The well attribute DataFrame with "WELL_NAME" and the popup_fields columns
+    # Return a Series of well name -> popup HTML. Keep the first row if a name is duplicated
+    
+    wells = vnWells_df.drop_duplicates("WELL_NAME")
+    # Header row is the same for all wells
+    header = "".join(f"<th>{field}</th>" for field in popup_fields)
+    # Data rows: one string operation per field, each over all wells at once. Missing values are empty cells
+    cells = pd.Series("", index=wells.index, dtype=object)
+    for field in popup_fields:
+        values = (wells[field].astype(object).fillna("").astype(str).str.replace("&", "&amp;", regex=False)
+                  .str.replace("<", "&lt;", regex=False).str.replace(">", "&gt;", regex=False))
+        cells = cells + "<td>" + values + "</td>"
+    popup_html = ('<table class="table table-striped table-hover table-condensed table-responsive"><thead><tr>' + header
+                  + "</tr></thead><tbody><tr>" + cells + "</tr></tbody></table>")
+    return pd.Series(popup_html.to_numpy(), index=wells["WELL_NAME"].to_numpy())